@@ -1,9 +1,13 @@
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session
 import random
 import json
-from utils.postfix import evaluate_postfix, is_valid_postfix
-from utils.infix_to_postfix import infix_to_postfix, get_conversion_steps
-from utils.problems import generate_problem, ProblemType
+from utils.postfix import (evaluate_postfix, is_valid_postfix, format_exact, parse_exact, answers_match,
+                           get_evaluation_steps, get_program_cache_stats, get_rejection_stats,
+                           EVALUATION_LIMITS)
+from utils.infix_to_postfix import (convert_with_steps, iter_conversion_steps, convert_batch,
+                                    get_conversion_cache_stats)
+from utils.lexer import InfixSyntaxError
+from utils.problems import generate_problem, ProblemType, RECENT_PROBLEM_LIMIT
 from utils.scratch_blocks import generate_scratch_problem
 from utils.pseudo_code import generate_written_code_problem
 from utils.big_o import generate_big_o_problem
@@ -11,6 +15,8 @@ from utils.exam_review import generate_exam_problem
 
 app = Flask(__name__)
 app.secret_key = 'postfix_trainer_secret_key_2024'
+# Reject oversized request bodies before they are parsed
+app.config['MAX_CONTENT_LENGTH'] = 256 * 1024
 
 @app.route('/')
 def index():
@@ -51,7 +57,12 @@ def api_generate_problem():
     problem_type = data.get('type', 'both')
     use_variables = data.get('use_variables', False)
     
-    problem = generate_problem(difficulty, problem_type, use_variables)
+    # Avoid serving a problem equivalent to one seen recently in this session
+    recent = session.get('recent_problems', [])
+    problem = generate_problem(difficulty, problem_type, use_variables, avoid=recent)
+    if problem['canonical'] is not None:
+        session['recent_problems'] = (recent + [problem['canonical']])[-RECENT_PROBLEM_LIMIT:]
+    
     return jsonify(problem)
 
 @app.route('/api/check-answer', methods=['POST'])
@@ -67,20 +78,21 @@ def api_check_answer():
         # Calculate correct answer first, even if user answer is invalid
         correct_result = None
         try:
-            correct_result = evaluate_postfix(original_expression)
+            correct_result = evaluate_postfix(original_expression, exact=True, limits=EVALUATION_LIMITS)
         except Exception as e:
             # If evaluation fails, try to use the correct_answer from the problem
             if correct_answer is not None:
                 try:
-                    correct_result = float(correct_answer)
+                    correct_result = parse_exact(correct_answer)
                 except:
                     correct_result = correct_answer if correct_answer is not None else "N/A"
             else:
                 correct_result = "N/A"
         
+        display_result = correct_result if isinstance(correct_result, str) else format_exact(correct_result)
+        
         try:
-            user_result = float(user_answer)
-            is_correct = abs(user_result - correct_result) < 0.0001
+            is_correct = answers_match(user_answer, correct_result)
             
             # Update session stats
             if 'stats' not in session:
@@ -99,7 +111,7 @@ def api_check_answer():
             
             return jsonify({
                 'correct': is_correct,
-                'correct_answer': correct_result,
+                'correct_answer': display_result,
                 'stats': session['stats']
             })
         except Exception as e:
@@ -113,7 +125,7 @@ def api_check_answer():
             
             return jsonify({
                 'correct': False,
-                'correct_answer': correct_result,
+                'correct_answer': display_result,
                 'error': 'Invalid answer format',
                 'stats': session['stats']
             })
@@ -182,23 +194,98 @@ def api_get_stats():
         'accuracy': round(accuracy, 1)
     })
 
+@app.route('/api/cache-stats', methods=['GET'])
+def api_cache_stats():
+    """Get cache counters and how many expressions the evaluation budgets rejected"""
+    return jsonify({
+        'conversion': get_conversion_cache_stats(),
+        'programs': get_program_cache_stats(),
+        'rejections': get_rejection_stats()
+    })
+
+def conversion_error(error):
+    """Error response body for an infix expression that failed to parse"""
+    return {'error': str(error), 'position': error.position}
+
+def stream_conversion_steps(infix_expr, delta):
+    """
+    Yield conversion steps as newline-delimited JSON, one step per line.
+    
+    The last line is {"result": ...}, or {"error": ..., "position": ...}
+    if the expression turned out to be invalid part way through.
+    """
+    postfix = []
+    try:
+        for step in iter_conversion_steps(infix_expr, delta, postfix):
+            yield json.dumps(step.to_dict()) + '\n'
+    except InfixSyntaxError as e:
+        yield json.dumps(conversion_error(e)) + '\n'
+        return
+    yield json.dumps({'result': ' '.join(postfix)}) + '\n'
+
 @app.route('/api/get-conversion-steps', methods=['POST'])
 def api_get_conversion_steps():
     """Get step-by-step conversion from infix to postfix"""
     data = request.json
     infix_expr = data.get('expression')
+    step_format = data.get('format', 'full')  # 'full' or 'delta'
     
     if not infix_expr:
         return jsonify({'error': 'No expression provided'})
     
-    steps = get_conversion_steps(infix_expr)
-    postfix_result = infix_to_postfix(infix_expr)
+    if not isinstance(infix_expr, str):
+        return jsonify({'error': 'Expression must be a string'})
+    
+    if step_format not in ('full', 'delta'):
+        return jsonify({'error': f'Unknown step format: {step_format}'})
+    
+    if data.get('stream'):
+        return Response(stream_conversion_steps(infix_expr, step_format == 'delta'),
+                        mimetype='application/x-ndjson')
+    
+    try:
+        postfix_result, steps = convert_with_steps(infix_expr, delta=step_format == 'delta')
+    except InfixSyntaxError as e:
+        return jsonify(conversion_error(e))
     
     return jsonify({
-        'steps': steps,
+        'steps': [step.to_dict() for step in steps],
         'result': postfix_result
     })
 
+@app.route('/api/convert-batch', methods=['POST'])
+def api_convert_batch():
+    """Convert a list of infix expressions to postfix in one request"""
+    data = request.json
+    expressions = data.get('expressions')
+    
+    if not isinstance(expressions, list) or not expressions:
+        return jsonify({'error': 'No expressions provided'})
+    
+    return jsonify({'results': convert_batch(expressions)})
+
+@app.route('/api/get-evaluation-steps', methods=['POST'])
+def api_get_evaluation_steps():
+    """Get step-by-step evaluation of a postfix expression"""
+    data = request.json
+    postfix_expr = data.get('expression')
+    
+    if not postfix_expr:
+        return jsonify({'error': 'No expression provided'})
+    
+    if not isinstance(postfix_expr, str):
+        return jsonify({'error': 'Expression must be a string'})
+    
+    try:
+        steps = get_evaluation_steps(postfix_expr, limits=EVALUATION_LIMITS)
+    except (ValueError, ArithmeticError) as e:
+        return jsonify({'error': str(e)})
+    
+    return jsonify({
+        'steps': steps,
+        'result': steps[-1]['push']
+    })
+
 @app.route('/api/reset-stats', methods=['POST'])
 def api_reset_stats():
     """Reset user statistics"""
@@ -0,0 +1,334 @@
+"""
+Microbenchmarks for the utils hot paths
+
+Sweeps each function across input sizes, writes the timings to JSON and
+compares them against a stored baseline. Exits with status 1 when any
+measurement is slower than the baseline by more than the threshold, or
+has no baseline entry to compare against.
+
+Every measurement round also times a fixed calibration loop, and each
+baseline timing is scaled by the ratio of the calibrations taken with it
+before comparing, so neither a faster or slower machine nor a stretch of
+throttling in the middle of a run reads as a regression.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --quick
+    python benchmarks/run_benchmarks.py --save-baseline
+"""
+
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.postfix import evaluate_postfix, evaluate_many, clear_program_cache, EVALUATION_LIMITS
+from utils.infix_to_postfix import infix_to_postfix, get_conversion_steps, tokenize, clear_conversion_cache
+from utils.infix_stream import convert_stream
+from utils.problems import generate_problem
+from utils.big_o import generate_big_o_problem
+from utils.scratch_blocks import generate_scratch_problem
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_OUTPUT = 'bench_results.json'
+
+# Token counts swept by the expression benchmarks
+SIZES = [5, 50, 500, 5000, 100000]
+QUICK_SIZES = [5, 50, 500]
+
+# Token counts of generated practice problems, as graded by /api/check-answer
+PROBLEM_SIZES = [5, 7, 9]
+
+# Batch sizes for evaluate_many, against evaluating the same problems one by one
+BATCH_SIZES = [100, 1000, 10000]
+QUICK_BATCH_SIZES = [100, 1000]
+
+# Token counts swept by the streaming converter, which should scale linearly
+STREAM_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+QUICK_STREAM_SIZES = [10 ** 3, 10 ** 4]
+
+# Minimum wall time spent per measurement round, in seconds, and rounds
+# per measurement; the best round is kept
+TARGET_TIME = 0.1
+REPEATS = 15
+
+# Iterations of the calibration loop timed after each round
+CALIBRATION_LOOPS = 20000
+
+def make_infix(tokens, seed=0, operators='+-*/^'):
+    """
+    Build a deterministic infix expression with roughly `tokens` tokens.
+    
+    Operands are single digits 1-9 and about one operand in eight is wrapped
+    in a parenthesized pair so the operator stack gets exercised.
+    """
+    rng = random.Random(seed)
+    parts = [str(rng.randint(1, 9))]
+    count = 1
+    
+    while count < tokens:
+        op = rng.choice(operators)
+        if rng.random() < 0.125 and count + 5 <= tokens:
+            parts.append(f"{op} ({rng.randint(1, 9)} {rng.choice(operators)} {rng.randint(1, 9)})")
+            count += 6
+        else:
+            parts.append(f"{op} {rng.randint(1, 9)}")
+            count += 2
+    
+    return ' '.join(parts)
+
+def make_batch(count):
+    """Build `count` distinct practice-sized postfix problems"""
+    return [make_postfix(9, seed=i) for i in range(count)]
+
+def make_infix_file(tokens, block=100000):
+    """
+    Write an infix expression of roughly `tokens` tokens to a temporary file.
+    
+    The expression is written one make_infix block at a time so that very
+    large inputs never exist in memory as a whole. The file is removed at exit.
+    
+    Returns:
+        Path of the file
+    """
+    handle, path = tempfile.mkstemp(prefix='bench_infix_', suffix='.txt')
+    atexit.register(os.remove, path)
+    written = 0
+    
+    with os.fdopen(handle, 'w') as f:
+        while written < tokens:
+            if written:
+                f.write(' + ')
+            size = min(block, tokens - written)
+            f.write(make_infix(size, seed=written))
+            written += size + 1
+    
+    return path
+
+def make_postfix(tokens, seed=0):
+    """Build a deterministic postfix expression that evaluates without errors"""
+    return infix_to_postfix(make_infix(tokens, seed, operators='+-*'))
+
+def _evaluate_uncached(expression):
+    clear_program_cache()
+    return evaluate_postfix(expression)
+
+def _check_answer(expression):
+    return evaluate_postfix(expression, exact=True, limits=EVALUATION_LIMITS)
+
+def _check_answer_uncached(expression):
+    clear_program_cache()
+    return _check_answer(expression)
+
+def _evaluate_loop(expressions):
+    clear_program_cache()
+    return [evaluate_postfix(expression) for expression in expressions]
+
+def _convert_uncached(expression):
+    clear_conversion_cache()
+    return infix_to_postfix(expression)
+
+def _steps_uncached(expression):
+    clear_conversion_cache()
+    return get_conversion_steps(expression)
+
+def _steps_rendered(expression):
+    return [step.to_dict() for step in _steps_uncached(expression)]
+
+def _convert_file(path):
+    with open(path, 'rb') as source, open(os.devnull, 'w') as sink:
+        return convert_stream(source, sink)
+
+# name -> (function, input builder, sizes, quick sizes)
+# Builders receive the size and return the positional arguments.
+BENCHMARKS = {
+    'evaluate_postfix': (_evaluate_uncached, lambda n: (make_postfix(n),), SIZES, QUICK_SIZES),
+    'evaluate_postfix_cached': (evaluate_postfix, lambda n: (make_postfix(n),), SIZES, QUICK_SIZES),
+    # The evaluation /api/check-answer runs, with the program cache warm and cold
+    'check_answer': (_check_answer, lambda n: (make_postfix(n),), PROBLEM_SIZES, PROBLEM_SIZES),
+    'check_answer_uncached': (_check_answer_uncached, lambda n: (make_postfix(n),), PROBLEM_SIZES, PROBLEM_SIZES),
+    # One batch call against a plain loop over the same expressions
+    'evaluate_many': (evaluate_many, lambda n: (make_batch(n),), BATCH_SIZES, QUICK_BATCH_SIZES),
+    'evaluate_postfix_loop': (_evaluate_loop, lambda n: (make_batch(n),), BATCH_SIZES, QUICK_BATCH_SIZES),
+    'tokenize': (tokenize, lambda n: (make_infix(n),), SIZES, QUICK_SIZES),
+    'infix_to_postfix': (_convert_uncached, lambda n: (make_infix(n),), SIZES, QUICK_SIZES),
+    'infix_to_postfix_cached': (infix_to_postfix, lambda n: (make_infix(n),), SIZES, QUICK_SIZES),
+    'get_conversion_steps': (_steps_uncached, lambda n: (make_infix(n),), SIZES, QUICK_SIZES),
+    # Rendered full steps repeat the output and stack, so this grows quadratically
+    'get_conversion_steps_rendered': (_steps_rendered, lambda n: (make_infix(n),),
+                                      [5, 50, 500, 2000], QUICK_SIZES),
+    'convert_stream': (_convert_file, lambda n: (make_infix_file(n),), STREAM_SIZES, QUICK_STREAM_SIZES),
+    # Generators take no size; sweep the difficulty instead
+    'generate_problem': (generate_problem, lambda d: (d, 'convert'),
+                         ['easy', 'medium', 'hard'], ['easy']),
+    'generate_big_o_problem': (generate_big_o_problem, lambda d: (d, 'both'),
+                               ['easy', 'medium', 'hard'], ['easy']),
+    'generate_scratch_problem': (generate_scratch_problem, lambda t: (t,),
+                                 ['stack', 'queue', 'recursion', 'binary_search'], ['stack']),
+}
+
+def measure(func, args):
+    """
+    Time one call of func(*args), and the calibration loop alongside it.
+    
+    The global random generator is reseeded before every round, so the
+    problem generators see the same draws in every run and mode.
+    
+    Returns:
+        Tuple (seconds, calibration): best seconds per call over REPEATS
+        rounds, and best seconds for the calibration loop over the same rounds
+    """
+    func(*args)
+    start = time.perf_counter()
+    func(*args)
+    single = time.perf_counter() - start
+    number = max(1, int(TARGET_TIME / max(single, 1e-9)))
+    
+    best = single
+    calibration = None
+    for _ in range(REPEATS):
+        random.seed(0)
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (time.perf_counter() - start) / number)
+        
+        start = time.perf_counter()
+        _calibration_loop(CALIBRATION_LOOPS)
+        elapsed = time.perf_counter() - start
+        calibration = elapsed if calibration is None else min(calibration, elapsed)
+    
+    return best, calibration
+
+def _calibration_loop(loops):
+    table = {}
+    text = []
+    for i in range(loops):
+        table[i & 255] = i * 3 + 1
+        text.append(str(i & 1023))
+    return len(' '.join(text)) + sum(table.values())
+
+def run(names=None, quick=False):
+    """
+    Run the selected benchmarks.
+    
+    Returns:
+        Tuple (results, calibrations): dictionaries of name -> {size:
+        seconds per call} and name -> {size: calibration seconds}
+    """
+    results = {}
+    calibrations = {}
+    
+    for name, (func, build, sizes, quick_sizes) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = {}
+        calibrations[name] = {}
+        for size in (quick_sizes if quick else sizes):
+            seconds, calibration = measure(func, build(size))
+            results[name][str(size)] = seconds
+            calibrations[name][str(size)] = calibration
+            print(f"{name:28} {str(size):>14} {seconds * 1e6:14.2f} us")
+    
+    return results, calibrations
+
+def compare(results, baseline, threshold, calibrations=None, baseline_calibrations=None):
+    """
+    Compare results against a baseline.
+    
+    Args:
+        results: Dictionary of name -> {size: seconds per call}
+        baseline: Results of the same shape to compare against
+        threshold: Allowed slowdown as a fraction
+        calibrations: Calibration seconds taken with results, same shape
+        baseline_calibrations: Calibration seconds taken with baseline; a
+            measurement's baseline timing is scaled by the ratio of its
+            calibrations when both are present
+    
+    Returns:
+        Tuple (regressions, missing): a list of (name, size, baseline
+        seconds, current seconds) for measurements slower than the
+        threshold allows, and a list of (name, size) for measurements the
+        baseline has no entry for
+    """
+    regressions = []
+    missing = []
+    
+    for name, timings in results.items():
+        for size, seconds in timings.items():
+            previous = baseline.get(name, {}).get(size)
+            if not previous:
+                missing.append((name, size))
+                continue
+            
+            current = (calibrations or {}).get(name, {}).get(size)
+            stored = (baseline_calibrations or {}).get(name, {}).get(size)
+            if current and stored:
+                previous *= current / stored
+            if seconds > previous * (1 + threshold):
+                regressions.append((name, size, previous, seconds))
+    
+    return regressions, missing
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the postfix trainer utils')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON file to write results to')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown before failing (0.25 = 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--quick', action='store_true', help='Only run the small sizes')
+    parser.add_argument('--only', nargs='*', help='Benchmark names to run')
+    args = parser.parse_args(argv)
+    
+    results, calibrations = run(args.only, args.quick)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+        'calibrations': calibrations
+    }
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+    
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --save-baseline to create one")
+        return 0
+    
+    with open(args.baseline) as f:
+        stored = json.load(f)
+    
+    # Baselines saved without calibrations are compared unscaled
+    regressions, missing = compare(results, stored['results'], args.threshold,
+                                   calibrations, stored.get('calibrations'))
+    for name, size, previous, seconds in regressions:
+        print(f"REGRESSION {name} [{size}]: {previous * 1e6:.2f} us -> {seconds * 1e6:.2f} us "
+              f"({(seconds / previous - 1) * 100:.0f}% slower)")
+    for name, size in missing:
+        print(f"MISSING {name} [{size}]: no baseline entry; run with --save-baseline to record it")
+    
+    if regressions or missing:
+        return 1
+    
+    print(f"No regressions beyond {args.threshold:.0%}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,8 +2,19 @@
 Postfix Trainer utilities package
 """
 
-from .postfix import evaluate_postfix, is_valid_postfix, format_postfix
-from .infix_to_postfix import infix_to_postfix, get_conversion_steps, tokenize
+from .postfix import (evaluate_postfix, is_valid_postfix, format_postfix,
+                      compile_postfix, get_program_cache_stats, evaluate_many,
+                      IncrementalEvaluator, format_exact, parse_exact, answers_match,
+                      validate_postfix_structure, get_evaluation_steps,
+                      evaluate_bindings, equivalent_by_sampling,
+                      EVALUATION_LIMITS, LimitExceeded, get_rejection_stats,
+                      evaluate_postfix_parallel)
+from .infix_to_postfix import (infix_to_postfix, get_conversion_steps, tokenize,
+                               iter_conversion_steps, convert_with_steps, parse_infix, InfixAst,
+                               convert_batch, canonical_hash, canonical_hash_ast, convert_with_hash,
+                               IncrementalConverter, ConversionStep)
+from .lexer import InfixSyntaxError
+from .expression_dag import build_dag, ExpressionDag
 from .problems import generate_problem, ProblemType
 from .code_blocks import generate_code_blocks, generate_typing_problem
 from .big_o import generate_big_o_problem
@@ -12,9 +23,37 @@ __all__ = [
     'evaluate_postfix',
     'is_valid_postfix',
     'format_postfix',
+    'compile_postfix',
+    'get_program_cache_stats',
+    'evaluate_many',
+    'IncrementalEvaluator',
+    'format_exact',
+    'parse_exact',
+    'answers_match',
+    'validate_postfix_structure',
+    'get_evaluation_steps',
+    'evaluate_bindings',
+    'equivalent_by_sampling',
+    'EVALUATION_LIMITS',
+    'LimitExceeded',
+    'get_rejection_stats',
+    'evaluate_postfix_parallel',
     'infix_to_postfix',
     'get_conversion_steps',
     'tokenize',
+    'iter_conversion_steps',
+    'convert_with_steps',
+    'parse_infix',
+    'InfixAst',
+    'convert_batch',
+    'canonical_hash',
+    'canonical_hash_ast',
+    'convert_with_hash',
+    'IncrementalConverter',
+    'ConversionStep',
+    'InfixSyntaxError',
+    'build_dag',
+    'ExpressionDag',
     'generate_problem',
     'ProblemType',
     'generate_code_blocks',
@@ -0,0 +1,244 @@
+"""
+Postfix expression DAG with shared subexpressions
+
+Identical subtrees are hash-consed into a single node, constant subtrees are
+folded while the DAG is built, and subtree values are memoized so the same
+structure can be evaluated many times with different variable values.
+"""
+
+import math
+from fractions import Fraction
+
+from utils.operators import EXACT_IMPLEMENTATIONS
+from utils.lexer import lex_postfix, OP_NUMBER, OP_NAME, SYMBOLS, ARITY_BY_CODE
+from utils.postfix import EVALUATION_LIMITS
+
+# Maximum number of memoized subtree values kept per DAG
+MEMO_SIZE = 4096
+
+# Powers are only folded while the result stays within the magnitude
+# budget used for client-supplied expressions
+FOLD_MAX_BITS = math.log2(EVALUATION_LIMITS['max_magnitude'])
+
+def _foldable(symbol, values):
+    """Whether folding symbol over constant values has a bounded cost"""
+    if symbol != '^':
+        return True
+    base, exponent = values
+    if base.__class__ is Fraction:
+        base = max(abs(base.numerator), base.denominator)
+    base = abs(base)
+    return base <= 1 or math.log2(base) * abs(float(exponent)) <= FOLD_MAX_BITS
+
+class DagNode:
+    """
+    One node of an expression DAG.
+    
+    kind is 'const', 'var' or 'op'. Constants keep their value, variables
+    their name, and operator nodes their symbol and child nodes. variables
+    is the sorted tuple of variable names the subtree depends on.
+    """
+    __slots__ = ('id', 'kind', 'value', 'children', 'variables')
+    
+    def __init__(self, node_id, kind, value, children, variables):
+        self.id = node_id
+        self.kind = kind
+        self.value = value
+        self.children = children
+        self.variables = variables
+    
+    def label(self):
+        """Display text for the node"""
+        if self.kind == 'const':
+            return str(self.value)
+        return self.value
+
+class ExpressionDag:
+    """
+    A pool of hash-consed expression nodes.
+    
+    Several expressions can share one ExpressionDag; subtrees that appear in
+    more than one of them are stored and evaluated once.
+    """
+    
+    def __init__(self):
+        self.nodes = []
+        self._table = {}
+        self._orders = {}
+        self._memo = {}
+    
+    def _intern(self, key, kind, value, children, variables):
+        node = self._table.get(key)
+        if node is None:
+            node = DagNode(len(self.nodes), kind, value, children, variables)
+            self.nodes.append(node)
+            self._table[key] = node
+        return node
+    
+    def constant(self, value):
+        """Get the node for a constant value"""
+        return self._intern(('const', value.__class__, value), 'const', value, (), ())
+    
+    def variable(self, name):
+        """Get the node for a variable"""
+        return self._intern(('var', name), 'var', name, (), (name,))
+    
+    def apply(self, symbol, *children):
+        """
+        Get the node for an operator applied to child nodes.
+        
+        If every child is a constant the result is folded into a constant,
+        except for powers too large to compute eagerly (see FOLD_MAX_BITS).
+        """
+        if all(child.kind == 'const' for child in children):
+            values = [child.value for child in children]
+            if _foldable(symbol, values):
+                return self.constant(EXACT_IMPLEMENTATIONS[symbol](*values))
+        
+        key = (symbol,) + tuple(child.id for child in children)
+        variables = tuple(sorted(set().union(*[child.variables for child in children])))
+        return self._intern(key, 'op', symbol, children, variables)
+    
+    def _order(self, root):
+        """Nodes reachable from root, children before parents"""
+        order = self._orders.get(root.id)
+        if order is None:
+            seen = set()
+            pending = [root]
+            while pending:
+                node = pending.pop()
+                if node.id not in seen:
+                    seen.add(node.id)
+                    pending.extend(node.children)
+            order = [self.nodes[node_id] for node_id in sorted(seen)]
+            self._orders[root.id] = order
+        return order
+    
+    def evaluate(self, root, bindings=None):
+        """
+        Evaluate the subtree under root.
+        
+        Shared nodes are computed once per call, and operator nodes are
+        memoized across calls by the values (and types, so 1 and 1.0 differ)
+        of the variables they use.
+        
+        Args:
+            root: DagNode to evaluate
+            bindings: Dictionary of variable name -> value
+        
+        Returns:
+            int/Fraction result (float if any binding is a float)
+        """
+        bindings = bindings or {}
+        values = {}
+        memo = self._memo
+        
+        for node in self._order(root):
+            if node.kind == 'const':
+                values[node.id] = node.value
+            elif node.kind == 'var':
+                if node.value not in bindings:
+                    raise ValueError(f"No binding for variable {node.value}")
+                values[node.id] = bindings[node.value]
+            else:
+                key = (node.id,) + tuple([(bindings[name].__class__, bindings[name])
+                                          for name in node.variables])
+                result = memo.get(key)
+                if result is None:
+                    result = EXACT_IMPLEMENTATIONS[node.value](*[values[child.id] for child in node.children])
+                    if len(memo) >= MEMO_SIZE:
+                        memo.clear()
+                    memo[key] = result
+                values[node.id] = result
+        
+        return values[root.id]
+    
+    def partial(self, root, bindings):
+        """
+        Substitute the bound variables and fold what becomes constant.
+        
+        Args:
+            root: DagNode to specialize
+            bindings: Dictionary of variable name -> value for some variables
+        
+        Returns:
+            DagNode (in this DAG) that depends only on the unbound variables
+        """
+        mapped = {}
+        
+        for node in self._order(root):
+            if node.kind == 'const':
+                mapped[node.id] = node
+            elif node.kind == 'var':
+                if node.value in bindings:
+                    mapped[node.id] = self.constant(bindings[node.value])
+                else:
+                    mapped[node.id] = node
+            elif not any(name in bindings for name in node.variables):
+                mapped[node.id] = node
+            else:
+                mapped[node.id] = self.apply(node.value, *[mapped[child.id] for child in node.children])
+        
+        return mapped[root.id]
+    
+    def to_dict(self, root):
+        """
+        Serialize the subtree under root for the client (e.g. a tree view).
+        
+        Returns:
+            Dictionary with 'root' (node id) and 'nodes', a list of
+            {'id', 'kind', 'label', 'children'} where children are node ids,
+            so shared subtrees appear once
+        """
+        return {
+            'root': root.id,
+            'nodes': [{
+                'id': node.id,
+                'kind': node.kind,
+                'label': node.label(),
+                'children': [child.id for child in node.children]
+            } for node in self._order(root)]
+        }
+
+def build_dag(expression, dag=None):
+    """
+    Build an expression DAG from a postfix expression.
+    
+    Args:
+        expression: String of postfix expression (e.g., "a b + a b + *")
+        dag: Optional ExpressionDag to add the expression to
+    
+    Returns:
+        Tuple (dag, root)
+    """
+    if not expression:
+        raise ValueError("Empty expression")
+    
+    if dag is None:
+        dag = ExpressionDag()
+    
+    stream = lex_postfix(expression)
+    stack = []
+    
+    for i, opcode in enumerate(stream.opcodes):
+        if opcode == OP_NUMBER:
+            stack.append(dag.constant(int(stream.text(i))))
+        elif opcode == OP_NAME:
+            stack.append(dag.variable(stream.text(i)))
+        elif opcode > OP_NUMBER:
+            symbol = SYMBOLS[opcode]
+            arity = ARITY_BY_CODE[opcode]
+            if len(stack) < arity:
+                raise ValueError(f"Not enough operands for operator {symbol} at position {stream.starts[i]}")
+            children = stack[-arity:]
+            del stack[-arity:]
+            stack.append(dag.apply(symbol, *children))
+        else:
+            raise ValueError(f"Invalid token: {stream.text(i)} at position {stream.starts[i]}")
+    
+    if not stack:
+        raise ValueError("No valid tokens in expression")
+    if len(stack) != 1:
+        raise ValueError("Invalid postfix expression")
+    
+    return dag, stack[0]
@@ -0,0 +1,210 @@
+"""
+Streaming infix to postfix conversion for very large expressions
+
+Reads one infix expression from a file or stdin in fixed-size chunks and
+writes each postfix token to a sink as soon as it is final, so peak memory
+depends on operator-stack depth rather than input size.
+
+Usage:
+    python -m utils.infix_stream expression.txt
+    generate_expression | python -m utils.infix_stream - > postfix.txt
+"""
+
+import argparse
+import sys
+
+from utils.lexer import (lex_infix, scan_infix, InfixSyntaxError, OP_NUMBER, OP_NAME, OP_LPAREN,
+                         OP_RPAREN, SYMBOLS, PRECEDENCE_BY_CODE, RIGHT_ASSOCIATIVE_CODES,
+                         PREFIX_CODES)
+
+# Bytes read per chunk
+CHUNK_SIZE = 1 << 16
+
+def _is_word_char(char):
+    """Whether char can continue a number or name token"""
+    return char.isalnum() or char == '.' or char == '_'
+
+def _iter_pieces(source, chunk_size):
+    """
+    Read a file in chunks cut between tokens.
+    
+    A number or name cut in half by a chunk boundary is carried over to the
+    next piece, so only one chunk plus one partial token is held at a time.
+    
+    Yields:
+        Tuples (offset, text) where offset is where text starts in the input
+    """
+    pending = ''
+    offset = 0
+    
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode('ascii', errors='replace')
+        
+        text = pending + chunk if pending else chunk
+        
+        # The trailing number or name may continue in the next chunk
+        cut = len(text)
+        while cut and _is_word_char(text[cut - 1]):
+            cut -= 1
+        
+        if cut:
+            yield offset, text[:cut]
+        pending = text[cut:]
+        offset += cut
+    
+    if pending:
+        yield offset, pending
+
+def iter_infix_tokens(source, chunk_size=CHUNK_SIZE):
+    """
+    Lazily scan an infix expression from a file, one chunk at a time.
+    
+    Args:
+        source: File object opened in text or binary mode
+        chunk_size: Number of bytes/characters to read at a time
+    
+    Yields:
+        Tuples (kind, text, start, end) as scan_infix does, with offsets
+        counted from the start of the input
+    """
+    for offset, piece in _iter_pieces(source, chunk_size):
+        yield from scan_infix(piece, offset)
+
+def iter_postfix_batches(source, chunk_size=CHUNK_SIZE):
+    """
+    Convert an infix expression read from a file, one chunk at a time.
+    
+    Each chunk is lexed in one go and run through the shunting-yard loop;
+    only the operator stack and the offsets of unclosed parentheses are
+    kept between chunks.
+    
+    Args:
+        source: File object opened in text or binary mode
+        chunk_size: Number of bytes/characters to read at a time
+    
+    Yields:
+        Lists of postfix token strings, in order
+    
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses;
+        batches from earlier chunks have already been yielded
+    """
+    stack = []
+    open_parens = []
+    
+    for offset, piece in _iter_pieces(source, chunk_size):
+        try:
+            stream = lex_infix(piece)
+        except InfixSyntaxError:
+            # Scan again lazily so the error reports its offset in the input
+            for _ in scan_infix(piece, offset):
+                pass
+            raise
+        
+        output = []
+        starts = stream.starts
+        
+        for i, (opcode, token) in enumerate(zip(stream.opcodes, stream.texts())):
+            if opcode == OP_NUMBER or opcode == OP_NAME:
+                output.append(token)
+            elif opcode == OP_LPAREN:
+                stack.append(opcode)
+                open_parens.append(starts[i] + offset)
+            elif opcode == OP_RPAREN:
+                while stack and stack[-1] != OP_LPAREN:
+                    output.append(SYMBOLS[stack.pop()])
+                if not stack:
+                    raise InfixSyntaxError("Mismatched parentheses", starts[i] + offset)
+                stack.pop()  # Remove '('
+                open_parens.pop()
+            else:
+                precedence = PRECEDENCE_BY_CODE[opcode]
+                left = opcode not in RIGHT_ASSOCIATIVE_CODES
+                # A prefix operator comes before its operand, so it pops nothing
+                while stack and stack[-1] != OP_LPAREN and opcode not in PREFIX_CODES:
+                    top = PRECEDENCE_BY_CODE[stack[-1]]
+                    if top > precedence or (top == precedence and left):
+                        output.append(SYMBOLS[stack.pop()])
+                    else:
+                        break
+                stack.append(opcode)
+        
+        if output:
+            yield output
+    
+    # Pop remaining operators
+    output = []
+    while stack:
+        if stack[-1] == OP_LPAREN:
+            raise InfixSyntaxError("Mismatched parentheses", open_parens[-1])
+        output.append(SYMBOLS[stack.pop()])
+    if output:
+        yield output
+
+def iter_postfix_tokens(source, chunk_size=CHUNK_SIZE):
+    """
+    Convert an infix expression read from a file, yielding postfix tokens.
+    
+    Args:
+        source: File object opened in text or binary mode
+        chunk_size: Number of bytes/characters to read at a time
+    
+    Yields:
+        Postfix token strings, in order (see iter_postfix_batches)
+    """
+    for batch in iter_postfix_batches(source, chunk_size):
+        yield from batch
+
+def convert_stream(source, sink, chunk_size=CHUNK_SIZE):
+    """
+    Convert an infix expression read from a file and write it to a sink.
+    
+    The postfix tokens of each input chunk are written with one write call.
+    
+    Args:
+        source: File object opened in text or binary mode
+        sink: Text file object, io.StringIO or anything else with write()
+        chunk_size: Number of bytes/characters to read at a time
+    
+    Returns:
+        Number of postfix tokens written
+    
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses; the
+        output of earlier chunks has already been written
+    """
+    count = 0
+    
+    for batch in iter_postfix_batches(source, chunk_size):
+        sink.write((' ' if count else '') + ' '.join(batch))
+        count += len(batch)
+    
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert one infix expression to postfix')
+    parser.add_argument('path', help="Input file, or '-' for stdin")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Bytes read per chunk')
+    args = parser.parse_args(argv)
+    
+    source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    
+    try:
+        convert_stream(source, sys.stdout, args.chunk_size)
+        print()
+    except InfixSyntaxError as e:
+        print()
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
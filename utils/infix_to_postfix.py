@@ -2,68 +2,322 @@
 Infix to Postfix conversion utilities
 """
 
+import hashlib
+import os
+import sys
+import threading
+from bisect import bisect_left
+from array import array
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from fractions import Fraction
+
+from utils.operators import (ARITY, PRECEDENCE, RIGHT_ASSOCIATIVE, COMMUTATIVE, IMPLEMENTATIONS,
+                             EXACT_IMPLEMENTATIONS)
+from utils.lexer import (lex_infix, scan_infix, infix_texts, InfixSyntaxError, OPCODES, OP_NUMBER, OP_NAME,
+                         OP_LPAREN, OP_RPAREN, SYMBOLS, KINDS, PRECEDENCE_BY_CODE, RIGHT_ASSOCIATIVE_CODES,
+                         PREFIX_CODES)
+
+# Deepest nesting of parentheses and right-associative chains the parser
+# accepts, which keeps its recursion well inside Python's limit
+AST_MAX_DEPTH = 256
+
+# Batches with at least this many characters in total are converted in a
+# process pool; smaller ones finish faster inline than the pool round trip
+BATCH_PARALLEL_THRESHOLD = 50000
+
+# Bounds for the conversion cache: entries, and approximate memory in
+# bytes held by the cached keys and results
+CONVERSION_CACHE_SIZE = 1024
+CONVERSION_CACHE_BYTES = 16 * 1024 * 1024
+
+# Bytes charged per cache entry for its key and entry tuples and its slot
+# in the cache, on top of the strings it holds
+CACHE_ENTRY_OVERHEAD = 224
+
+# Bytes charged per ConversionStep record for the record, its token text,
+# stack node and list slots, and extra for each step past the 256th, whose
+# step number and output offsets no longer fit CPython's cached small ints.
+# Measured with tracemalloc on traces of 10 to 5000 steps
+STEP_ENTRY_SIZE = 180
+STEP_INDEX_SIZE = 96
+
+# Longest canonical form kept as text by canonical_hash; longer subtree
+# forms are replaced by an 8-byte digest
+CANONICAL_FORM_SIZE = 64
+
 def get_operator_precedence(op):
     """Get operator precedence (higher number = higher precedence)"""
-    precedence = {
-        '+': 1,
-        '-': 1,
-        '*': 2,
-        '/': 2,
-        '^': 3,
-        '(': 0,
-        ')': 0
-    }
-    return precedence.get(op, 0)
+    return PRECEDENCE.get(op, 0)
 
 def is_left_associative(op):
     """Check if operator is left-associative"""
-    return op != '^'
+    return op not in RIGHT_ASSOCIATIVE
+
+def _pop_for_operator(opcode, stack):
+    """
+    Pop operator codes that bind at least as tightly as opcode; return them in order.
+    
+    A prefix operator comes before its operand, so it pops nothing.
+    """
+    precedence = PRECEDENCE_BY_CODE[opcode]
+    left = opcode not in RIGHT_ASSOCIATIVE_CODES
+    popped = []
+    
+    while stack and stack[-1] != OP_LPAREN and opcode not in PREFIX_CODES:
+        top = PRECEDENCE_BY_CODE[stack[-1]]
+        if top > precedence or (top == precedence and left):
+            popped.append(stack.pop())
+        else:
+            break
+    
+    return popped
+
+def _mismatched(position):
+    """Error for a '(' that is never closed or a ')' that closes nothing"""
+    return InfixSyntaxError("Mismatched parentheses", position)
+
+_conversion_cache = OrderedDict()
+_conversion_cache_lock = threading.Lock()
+_conversion_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+
+def _entry_size(key, value):
+    """Approximate memory held by a cache entry, in bytes, as tracemalloc counts it"""
+    size = CACHE_ENTRY_OVERHEAD + sys.getsizeof(key[1])
+    if value.__class__ is str:
+        return size + sys.getsizeof(value)
+    
+    postfix, steps = value
+    size += sys.getsizeof(value) + sys.getsizeof(postfix)
+    if steps.__class__ is not list:
+        # Postfix and canonical hash from convert_with_hash
+        return size + sys.getsizeof(steps)
+    
+    # The steps list and the output list they share are charged with them
+    return size + STEP_ENTRY_SIZE * len(steps) + STEP_INDEX_SIZE * max(len(steps) - 256, 0)
+
+def _cache_get(kind, expression):
+    """
+    Look up a conversion result, counting the hit or miss.
+    
+    The expression is first looked up exactly as given, which costs one
+    dictionary lookup. Only if that misses is it split into token texts
+    and looked up by their normalized spelling, which is also the key a
+    new result is stored under.
+    
+    Returns:
+        Tuple (result, key): the cached result or None, and the normalized
+        key, or None when the expression was found as given
+    """
+    with _conversion_cache_lock:
+        entry = _conversion_cache.get((kind, expression))
+        if entry is not None:
+            _conversion_cache.move_to_end((kind, expression))
+            _conversion_cache_stats['hits'] += 1
+            return entry[0], None
+    
+    key = (kind, ' '.join(infix_texts(expression)))
+    with _conversion_cache_lock:
+        entry = _conversion_cache.get(key) if key[1] != expression else None
+        if entry is None:
+            _conversion_cache_stats['misses'] += 1
+            return None, key
+        _conversion_cache.move_to_end(key)
+        _conversion_cache_stats['hits'] += 1
+        return entry[0], key
+
+def _cache_put(key, value, expression):
+    """
+    Store a conversion result, evicting least recently used entries.
+    
+    The result is stored under its normalized key and, if it differs, the
+    spelling it was requested with. Each entry is charged in full, as
+    either one keeps the result alive, so bytes overcounts such pairs.
+    """
+    size = _entry_size(key, value)
+    if size > CONVERSION_CACHE_BYTES:
+        return
+    
+    with _conversion_cache_lock:
+        _cache_insert(key, value, size)
+        if expression != key[1]:
+            _cache_insert((key[0], expression), value,
+                          size - sys.getsizeof(key[1]) + sys.getsizeof(expression))
+        while (len(_conversion_cache) > CONVERSION_CACHE_SIZE or
+               _conversion_cache_stats['bytes'] > CONVERSION_CACHE_BYTES):
+            _, (_, evicted) = _conversion_cache.popitem(last=False)
+            _conversion_cache_stats['bytes'] -= evicted
+            _conversion_cache_stats['evictions'] += 1
+
+def _cache_insert(key, value, size):
+    """Add or replace one entry; the caller holds the lock"""
+    previous = _conversion_cache.pop(key, None)
+    if previous is not None:
+        _conversion_cache_stats['bytes'] -= previous[1]
+    _conversion_cache[key] = (value, size)
+    _conversion_cache_stats['bytes'] += size
+
+def get_conversion_cache_stats():
+    """
+    Get counters for the conversion cache.
+    
+    Returns:
+        Dictionary with 'hits', 'misses', 'evictions', 'size', 'bytes',
+        'max_size' and 'max_bytes'
+    """
+    with _conversion_cache_lock:
+        return {
+            'hits': _conversion_cache_stats['hits'],
+            'misses': _conversion_cache_stats['misses'],
+            'evictions': _conversion_cache_stats['evictions'],
+            'size': len(_conversion_cache),
+            'bytes': _conversion_cache_stats['bytes'],
+            'max_size': CONVERSION_CACHE_SIZE,
+            'max_bytes': CONVERSION_CACHE_BYTES
+        }
+
+def clear_conversion_cache():
+    """Drop all cached conversions and reset the cache counters"""
+    with _conversion_cache_lock:
+        _conversion_cache.clear()
+        for name in _conversion_cache_stats:
+            _conversion_cache_stats[name] = 0
 
 def infix_to_postfix(infix_expr):
     """
     Convert infix expression to postfix notation.
     
+    Results are cached by token sequence, so "3+4*5" and "3 + 4 * 5"
+    share a result, and the expression is only lexed on a cache miss.
+    
     Args:
         infix_expr: String of infix expression (e.g., "a + b * c")
     
     Returns:
         Postfix expression as string
-    """
-    # Remove spaces and prepare tokens
-    tokens = tokenize(infix_expr)
     
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses
+    """
+    postfix, key = _cache_get('postfix', infix_expr)
+    if postfix is None:
+        postfix = _convert(lex_infix(infix_expr))
+    if key is not None:
+        _cache_put(key, postfix, infix_expr)
+    return postfix
+
+def _convert(stream):
+    """Run the shunting-yard algorithm over a lexed infix expression"""
     output = []
+    add = output.append
     stack = []
+    open_parens = []  # Token indices, turned into offsets only for an error
     
-    for token in tokens:
-        if token.isalnum() or token.replace('.', '').replace('-', '').isdigit():
+    for i, (opcode, token) in enumerate(zip(stream.opcodes, stream.texts())):
+        if opcode == OP_NUMBER or opcode == OP_NAME:
             # Operand
-            output.append(token)
-        elif token == '(':
-            stack.append(token)
-        elif token == ')':
-            while stack and stack[-1] != '(':
-                output.append(stack.pop())
-            if stack:
-                stack.pop()  # Remove '('
-        elif token in ['+', '-', '*', '/', '^']:
+            add(token)
+        elif opcode == OP_LPAREN:
+            stack.append(opcode)
+            open_parens.append(i)
+        elif opcode == OP_RPAREN:
+            while stack and stack[-1] != OP_LPAREN:
+                add(SYMBOLS[stack.pop()])
+            if not stack:
+                raise _mismatched(stream.starts[i])
+            stack.pop()  # Remove '('
+            open_parens.pop()
+        elif opcode > OP_NUMBER:
             # Operator
-            while (stack and 
-                   stack[-1] != '(' and
-                   (get_operator_precedence(stack[-1]) > get_operator_precedence(token) or
-                    (get_operator_precedence(stack[-1]) == get_operator_precedence(token) and 
-                     is_left_associative(token)))):
-                output.append(stack.pop())
-            stack.append(token)
+            for op in _pop_for_operator(opcode, stack):
+                add(SYMBOLS[op])
+            stack.append(opcode)
     
     # Pop remaining operators
     while stack:
-        if stack[-1] == '(':
-            raise ValueError("Mismatched parentheses")
-        output.append(stack.pop())
+        if stack[-1] == OP_LPAREN:
+            raise _mismatched(stream.starts[open_parens[-1]])
+        add(SYMBOLS[stack.pop()])
     
     return ' '.join(output)
 
+def _convert_item(expression):
+    """Convert one batch item, reporting an error instead of raising"""
+    if not isinstance(expression, str) or not expression.strip():
+        return {'error': 'Expression must be a non-empty string'}
+    try:
+        return {'result': infix_to_postfix(expression)}
+    except InfixSyntaxError as e:
+        return {'error': str(e), 'position': e.position}
+
+def _convert_chunk(expressions):
+    """Process pool worker: convert a slice of a batch"""
+    return [_convert_item(expression) for expression in expressions]
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
+def _get_batch_executor(workers):
+    """Get the shared process pool, starting it on first use"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is None:
+            _batch_executor = ProcessPoolExecutor(max_workers=workers)
+        return _batch_executor
+
+def _discard_batch_executor(executor):
+    """Drop a broken pool so the next large batch starts a fresh one"""
+    global _batch_executor
+    with _batch_executor_lock:
+        if _batch_executor is executor:
+            _batch_executor = None
+    executor.shutdown(wait=False)
+
+def convert_batch(expressions, workers=None, threshold=BATCH_PARALLEL_THRESHOLD):
+    """
+    Convert many infix expressions to postfix.
+    
+    Large batches are split into chunks that run in a shared process pool;
+    small ones, and any batch when the pool cannot be used, run inline. A
+    pool whose workers died is replaced on the next large batch.
+    
+    Args:
+        expressions: List of infix expression strings
+        workers: Number of worker processes (defaults to the CPU count)
+        threshold: Minimum total characters for parallel conversion
+    
+    Returns:
+        List with one dictionary per expression, in order: {'result': postfix}
+        or {'error': message, 'position': offset} ('position' is omitted
+        when the item is not a string)
+    """
+    workers = workers or os.cpu_count() or 1
+    size = sum([len(expression) for expression in expressions if isinstance(expression, str)])
+    
+    if size < threshold or workers < 2 or len(expressions) < 2:
+        return _convert_chunk(expressions)
+    
+    step = -(-len(expressions) // (workers * 4))
+    chunks = [expressions[i:i + step] for i in range(0, len(expressions), step)]
+    
+    try:
+        executor = _get_batch_executor(workers)
+    except (OSError, NotImplementedError):
+        # No process support (e.g. a restricted serverless runtime)
+        return _convert_chunk(expressions)
+    
+    try:
+        results = []
+        for converted in executor.map(_convert_chunk, chunks):
+            results.extend(converted)
+        return results
+    except (OSError, NotImplementedError):
+        return _convert_chunk(expressions)
+    except BrokenExecutor:
+        # A worker was killed; the pool cannot run anything any more
+        _discard_batch_executor(executor)
+        return _convert_chunk(expressions)
+
 def tokenize(expression):
     """
     Tokenize an infix expression.
@@ -75,132 +329,767 @@ def tokenize(expression):
     Returns:
         List of tokens
     """
-    expression = expression.replace(' ', '')
-    tokens = []
-    i = 0
-    
-    while i < len(expression):
-        if expression[i].isdigit() or expression[i] == '.':
-            # Number (including decimals)
-            num = ''
-            while i < len(expression) and (expression[i].isdigit() or expression[i] == '.'):
-                num += expression[i]
-                i += 1
-            tokens.append(num)
-            continue
-        elif expression[i].isalnum():
-            # Variable (single letter or word)
-            var = ''
-            while i < len(expression) and expression[i].isalnum():
-                var += expression[i]
-                i += 1
-            tokens.append(var)
-            continue
-        else:
-            # Operator or parenthesis
-            tokens.append(expression[i])
-            i += 1
+    return infix_texts(expression)
+
+def _stack_symbols(stack, count):
+    """Symbols of the top count entries of a persistent stack, bottom first"""
+    symbols = []
+    for _ in range(count):
+        symbols.append(SYMBOLS[stack[0]])
+        stack = stack[1]
+    symbols.reverse()
+    return symbols
+
+class ConversionStep:
+    """
+    One step of the infix to postfix conversion, stored as references.
+    
+    output is a list of postfix tokens shared with the other steps of the
+    trace; the step added output[before:emitted] and shows output[:emitted].
+    stack is the operator stack shown by the step, a persistent linked stack
+    of (opcode, rest) tuples that shares its tail with the steps before it,
+    and depth is its height. The stack went from depth shown at the previous
+    step down to depth low, then up to this step's stack.
+    
+    Display strings are only built when the step is serialized with
+    to_dict(), or indexed like the dictionary it renders to.
+    """
+    __slots__ = ('number', 'token', 'kind', 'output', 'before', 'emitted',
+                 'stack', 'depth', 'shown', 'low', 'delta')
+    
+    def __init__(self, number, token, kind, output, before, emitted, stack, depth, shown, low, delta):
+        self.number = number
+        self.token = token
+        self.kind = kind  # Token kind from scan_infix, or 'end' for the final step
+        self.output = output
+        self.before = before
+        self.emitted = emitted
+        self.stack = stack
+        self.depth = depth
+        self.shown = shown
+        self.low = low
+        self.delta = delta
     
-    return tokens
+    def emit(self):
+        """Tokens this step appended to the output"""
+        return self.output[self.before:self.emitted]
+    
+    def push(self):
+        """Symbols this step left on the stack above depth low, bottom first"""
+        return _stack_symbols(self.stack, self.depth - self.low)
+    
+    def action(self):
+        """Describe the step"""
+        token = self.token
+        kind = self.kind
+        if kind == 'number' or kind == 'name':
+            return f'Add {token} to output (operand)'
+        if kind == 'lparen':
+            return 'Push ( to stack'
+        
+        popped = ', '.join(self.emit())
+        if kind == 'rparen':
+            return f'Pop {popped} from stack to output'
+        if kind == 'end':
+            return f'Pop remaining operators: {popped}'
+        if popped:
+            return f'Pop {popped} from stack (higher/equal precedence), then push {token}'
+        return f'Push {token} to stack'
+    
+    def render_stack(self):
+        """Render the whole stack for display"""
+        if self.stack is None:
+            return '(empty)'
+        return ' '.join(_stack_symbols(self.stack, self.depth))
+    
+    def to_dict(self):
+        """
+        Render the step as a dictionary for serialization.
+        
+        Returns:
+            Dictionary with 'step', 'token', 'output', 'stack', 'action' for
+            full steps, and 'emit', 'pop' and 'push' instead of 'output' and
+            'stack' for delta steps, which carry only the change since the
+            previous step
+        """
+        if not self.delta:
+            return {
+                'step': self.number,
+                'token': self.token,
+                'output': ' '.join(self.output[:self.emitted]),
+                'stack': self.render_stack(),
+                'action': self.action()
+            }
+        
+        return {
+            'step': self.number,
+            'token': self.token,
+            'emit': self.emit(),
+            'pop': self.shown - self.low,
+            'push': self.push(),
+            'action': self.action()
+        }
+    
+    def __getitem__(self, key):
+        if key == 'step':
+            return self.number
+        if key == 'token':
+            return self.token
+        if key == 'action':
+            return self.action()
+        if self.delta:
+            if key == 'emit':
+                return self.emit()
+            if key == 'pop':
+                return self.shown - self.low
+            if key == 'push':
+                return self.push()
+        elif key == 'output':
+            return ' '.join(self.output[:self.emitted])
+        elif key == 'stack':
+            return self.render_stack()
+        raise KeyError(key)
+    
+    def __eq__(self, other):
+        if isinstance(other, ConversionStep):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return f'ConversionStep({self.to_dict()!r})'
 
-def get_conversion_steps(infix_expr):
+def iter_conversion_steps(infix_expr, delta=False, postfix=None):
     """
-    Get step-by-step conversion process from infix to postfix.
+    Generate the steps of the infix to postfix conversion lazily.
+    
+    The expression is scanned as the steps are consumed, so the first step
+    is available right away and the step list is never held in memory.
     
     Args:
         infix_expr: String of infix expression
+        delta: If True, yield steps that render only what they changed
+            (see ConversionStep.to_dict)
+        postfix: Optional list that receives the postfix tokens, so the
+            result needs no second conversion pass
     
-    Returns:
-        List of step dictionaries with 'token', 'output', 'stack', 'action'
+    Yields:
+        ConversionStep records; to_dict() renders each one
+    
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses,
+        after the steps before it have been yielded
     """
-    tokens = tokenize(infix_expr)
-    steps = []
+    return _trace_steps(scan_infix(infix_expr), delta, postfix)
+
+def _trace_steps(tokens, delta, postfix):
+    """Generate conversion steps from scanned (kind, text, start, end) tokens"""
     output = []
-    stack = []
+    stack = None  # Persistent stack of (opcode, rest) tuples
+    depth = 0
+    shown = 0     # Stack depth shown by the last step
+    open_parens = []
+    count = 0
     
-    for i, token in enumerate(tokens):
-        if token.isalnum() or token.replace('.', '').replace('-', '').isdigit():
+    for kind, token, start, _ in tokens:
+        count += 1
+        before = len(output)
+        low = shown
+        
+        if kind == 'number' or kind == 'name':
             # Operand
             output.append(token)
-            steps.append({
-                'step': i + 1,
-                'token': token,
-                'output': ' '.join(output),
-                'stack': ' '.join(stack) if stack else '(empty)',
-                'action': f'Add {token} to output (operand)'
-            })
-        elif token == '(':
-            stack.append(token)
-            steps.append({
-                'step': i + 1,
-                'token': token,
-                'output': ' '.join(output),
-                'stack': ' '.join(stack),
-                'action': 'Push ( to stack'
-            })
-        elif token == ')':
-            popped = []
-            while stack and stack[-1] != '(':
-                popped.append(stack.pop())
-                output.append(popped[-1])
-            
-            if stack:
-                stack.pop()  # Remove '('
-            
-            steps.append({
-                'step': i + 1,
-                'token': token,
-                'output': ' '.join(output),
-                'stack': ' '.join(stack) if stack else '(empty)',
-                'action': f'Pop {", ".join(popped)} from stack to output'
-            })
-        elif token in ['+', '-', '*', '/', '^']:
-            popped_ops = []
-            while (stack and 
-                   stack[-1] != '(' and
-                   (get_operator_precedence(stack[-1]) > get_operator_precedence(token) or
-                    (get_operator_precedence(stack[-1]) == get_operator_precedence(token) and 
-                     is_left_associative(token)))):
-                op = stack.pop()
-                popped_ops.append(op)
-                output.append(op)
-            
-            if popped_ops:
-                steps.append({
-                    'step': i + 1,
-                    'token': token,
-                    'output': ' '.join(output),
-                    'stack': ' '.join(stack) if stack else '(empty)',
-                    'action': f'Pop {", ".join(popped_ops)} from stack (higher/equal precedence), then push {token}'
-                })
-            else:
-                steps.append({
-                    'step': i + 1,
-                    'token': token,
-                    'output': ' '.join(output),
-                    'stack': ' '.join(stack) if stack else '(empty)',
-                    'action': f'Push {token} to stack'
-                })
+        elif kind == 'lparen':
+            stack = (OP_LPAREN, stack)
+            depth += 1
+            open_parens.append(start)
+        elif kind == 'rparen':
+            while stack is not None and stack[0] != OP_LPAREN:
+                output.append(SYMBOLS[stack[0]])
+                stack = stack[1]
+                depth -= 1
             
-            stack.append(token)
+            if stack is None:
+                raise _mismatched(start)
+            stack = stack[1]  # Remove '('
+            depth -= 1
+            open_parens.pop()
+            if depth < low:
+                low = depth
+        else:
+            opcode = OPCODES[token]
+            precedence = PRECEDENCE_BY_CODE[opcode]
+            left = opcode not in RIGHT_ASSOCIATIVE_CODES
+            # A prefix operator comes before its operand, so it pops nothing
+            while stack is not None and stack[0] != OP_LPAREN and opcode not in PREFIX_CODES:
+                top = PRECEDENCE_BY_CODE[stack[0]]
+                if top > precedence or (top == precedence and left):
+                    output.append(SYMBOLS[stack[0]])
+                    stack = stack[1]
+                    depth -= 1
+                else:
+                    break
+            if depth < low:
+                low = depth
+        
+        yield ConversionStep(count, token, kind, output, before, len(output), stack, depth, shown, low, delta)
+        shown = depth
+        
+        # An operator is shown on the stack from the next step on
+        if kind == 'operator':
+            stack = (opcode, stack)
+            depth += 1
     
     # Final step: pop remaining operators
-    if stack:
-        final_popped = []
-        while stack:
-            if stack[-1] == '(':
-                raise ValueError("Mismatched parentheses")
-            op = stack.pop()
-            final_popped.append(op)
-            output.append(op)
-        
-        steps.append({
-            'step': len(tokens) + 1,
-            'token': '(end)',
-            'output': ' '.join(output),
-            'stack': '(empty)',
-            'action': f'Pop remaining operators: {", ".join(final_popped)}'
-        })
-    
-    return steps
+    if stack is not None:
+        before = len(output)
+        while stack is not None:
+            if stack[0] == OP_LPAREN:
+                raise _mismatched(open_parens[-1])
+            output.append(SYMBOLS[stack[0]])
+            stack = stack[1]
+        
+        yield ConversionStep(count + 1, '(end)', 'end', output, before, len(output), None, 0, shown, 0, delta)
+    
+    if postfix is not None:
+        postfix.extend(output)
+
+def get_conversion_steps(infix_expr, delta=False):
+    """
+    Get step-by-step conversion process from infix to postfix.
+    
+    Args:
+        infix_expr: String of infix expression
+        delta: If True, record only what each step changed (see
+            ConversionStep.to_dict)
+    
+    Returns:
+        List of ConversionStep records; it may be shared with the
+        conversion cache, so do not modify it
+    """
+    return convert_with_steps(infix_expr, delta)[1]
+
+def convert_with_steps(infix_expr, delta=False):
+    """
+    Convert infix to postfix and trace the steps in a single pass.
+    
+    Args:
+        infix_expr: String of infix expression
+        delta: If True, record only what each step changed (see
+            ConversionStep.to_dict)
+    
+    Returns:
+        Tuple (postfix, steps): the postfix expression as a string and the
+        list of ConversionStep records. Results are cached by token
+        sequence and shared, so do not modify the steps.
+    
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses; its
+        position attribute is the character offset of the problem
+    """
+    result, key = _cache_get('delta' if delta else 'full', infix_expr)
+    if result is None:
+        postfix = []
+        steps = list(_trace_steps(scan_infix(infix_expr), delta, postfix))
+        result = (' '.join(postfix), steps)
+    if key is not None:
+        _cache_put(key, result, infix_expr)
+    return result
+
+class InfixAst:
+    """
+    Parsed infix expression stored as a compact array-backed tree.
+    
+    Nodes are kept in postorder (children before parents, root last).
+    codes holds each node's opcode, tokens the index of its token in
+    stream, and left/right the child node indices (-1 for leaves; a prefix
+    operator's operand is its left child and right is -1). Every notation
+    and the value are derived from this one parse.
+    """
+    __slots__ = ('stream', 'codes', 'tokens', 'left', 'right')
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.codes = array('b')
+        self.tokens = array('l')
+        self.left = array('l')
+        self.right = array('l')
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    def add(self, token, left=-1, right=-1):
+        """Append a node for the token at index token; return the node index"""
+        self.codes.append(self.stream.opcodes[token])
+        self.tokens.append(token)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.codes) - 1
+    
+    def postfix(self):
+        """Get the expression in postfix notation"""
+        text = self.stream.text
+        return ' '.join([text(token) for token in self.tokens])
+    
+    def prefix(self):
+        """Get the expression in prefix notation"""
+        text = self.stream.text
+        parts = []
+        pending = [len(self.codes) - 1]
+        
+        while pending:
+            node = pending.pop()
+            parts.append(text(self.tokens[node]))
+            if self.right[node] >= 0:
+                pending.append(self.right[node])
+            if self.left[node] >= 0:
+                pending.append(self.left[node])
+        
+        return ' '.join(parts)
+    
+    def parenthesized(self):
+        """Get the expression as infix with every operation in parentheses"""
+        text = self.stream.text
+        parts = []
+        pending = [len(self.codes) - 1]
+        
+        while pending:
+            item = pending.pop()
+            if item.__class__ is str:
+                parts.append(item)
+            elif self.left[item] < 0:
+                parts.append(text(self.tokens[item]))
+            elif self.right[item] < 0:
+                pending.extend((')', self.left[item], text(self.tokens[item]), '('))
+            else:
+                pending.extend((')', self.right[item], f' {text(self.tokens[item])} ', self.left[item], '('))
+        
+        return ''.join(parts)
+    
+    def evaluate(self, variables=None, exact=False):
+        """
+        Evaluate the expression.
+        
+        Args:
+            variables: Dictionary of variable name -> value
+            exact: If True, use int/Fraction arithmetic (see evaluate_postfix)
+        
+        Returns:
+            Result of the expression
+        """
+        implementations = EXACT_IMPLEMENTATIONS if exact else IMPLEMENTATIONS
+        stream = self.stream
+        variables = variables or {}
+        values = []
+        
+        for node, code in enumerate(self.codes):
+            token = self.tokens[node]
+            if code == OP_NUMBER:
+                if exact:
+                    number = stream.text(token)
+                    values.append(Fraction(number) if '.' in number else int(number))
+                else:
+                    values.append(stream.values[token])
+            elif code == OP_NAME:
+                name = stream.text(token)
+                if name not in variables:
+                    raise ValueError(f"No binding for variable {name}")
+                values.append(variables[name])
+            elif self.right[node] < 0:
+                values.append(implementations[SYMBOLS[code]](values[self.left[node]]))
+            else:
+                values.append(implementations[SYMBOLS[code]](values[self.left[node]], values[self.right[node]]))
+        
+        return values[-1]
+    
+    def steps(self, delta=False):
+        """
+        Get the shunting-yard conversion steps, replayed from the parsed tokens.
+        
+        Args:
+            delta: If True, record only what each step changed (see
+                ConversionStep.to_dict)
+        
+        Returns:
+            List of ConversionStep records
+        """
+        stream = self.stream
+        tokens = ((KINDS[code], stream.text(i), stream.starts[i], stream.ends[i])
+                  for i, code in enumerate(stream.opcodes))
+        return list(_trace_steps(tokens, delta, None))
 
+class _PrattParser:
+    """Recursive-descent parser over a token stream using operator binding powers"""
+    __slots__ = ('stream', 'ast', 'index', 'depth')
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.ast = InfixAst(stream)
+        self.index = 0
+        self.depth = 0
+    
+    def position(self):
+        """Offset of the next token, or the end of the source"""
+        if self.index < len(self.stream):
+            return self.stream.starts[self.index]
+        return len(self.stream.source)
+    
+    def expression(self, min_precedence):
+        """Parse operators binding at least min_precedence; return the node index"""
+        self.depth += 1
+        if self.depth > AST_MAX_DEPTH:
+            raise InfixSyntaxError("Expression is nested too deeply", self.position())
+        
+        opcodes = self.stream.opcodes
+        left = self.operand()
+        
+        while self.index < len(opcodes):
+            opcode = opcodes[self.index]
+            if opcode <= OP_NUMBER or opcode in PREFIX_CODES:
+                break
+            precedence = PRECEDENCE_BY_CODE[opcode]
+            if precedence < min_precedence:
+                break
+            token = self.index
+            self.index += 1
+            # Right-associative operators bind their own level on the right
+            right = self.expression(precedence if opcode in RIGHT_ASSOCIATIVE_CODES else precedence + 1)
+            left = self.ast.add(token, left, right)
+        
+        self.depth -= 1
+        return left
+    
+    def operand(self):
+        """Parse a number, a name, a prefix operation or a parenthesized expression"""
+        if self.index >= len(self.stream):
+            raise InfixSyntaxError("Expected an operand", self.position())
+        
+        opcode = self.stream.opcodes[self.index]
+        if opcode == OP_NUMBER or opcode == OP_NAME:
+            self.index += 1
+            return self.ast.add(self.index - 1)
+        if opcode in PREFIX_CODES:
+            # Binds its operand like the right side of a binary operator
+            token = self.index
+            self.index += 1
+            precedence = PRECEDENCE_BY_CODE[opcode]
+            node = self.expression(precedence if opcode in RIGHT_ASSOCIATIVE_CODES else precedence + 1)
+            return self.ast.add(token, node)
+        if opcode == OP_LPAREN:
+            start = self.stream.starts[self.index]
+            self.index += 1
+            node = self.expression(0)
+            if self.index >= len(self.stream) or self.stream.opcodes[self.index] != OP_RPAREN:
+                raise _mismatched(start)
+            self.index += 1
+            return node
+        if opcode == OP_RPAREN:
+            raise _mismatched(self.position())
+        raise InfixSyntaxError("Expected an operand", self.position())
+
+def parse_infix(infix_expr):
+    """
+    Parse an infix expression into an InfixAst.
+    
+    Unlike the shunting-yard conversion, the parser rejects malformed input
+    such as two operands in a row ("a (b + c)") or a dangling operator.
+    
+    Args:
+        infix_expr: String of infix expression (e.g., "a + b * c")
+    
+    Returns:
+        InfixAst
+    
+    Raises:
+        InfixSyntaxError: On any syntax error, with its position
+    """
+    parser = _PrattParser(lex_infix(infix_expr))
+    if not len(parser.stream):
+        raise InfixSyntaxError("Empty expression", 0)
+    
+    parser.expression(0)
+    if parser.index < len(parser.stream):
+        if parser.stream.opcodes[parser.index] == OP_RPAREN:
+            raise _mismatched(parser.position())
+        raise InfixSyntaxError("Expected an operator", parser.position())
+    
+    return parser.ast
+
+def canonical_hash(infix_expr):
+    """
+    Hash an infix expression so that equivalent spellings collide.
+    
+    The hash ignores whitespace, redundant parentheses, the spelling of
+    numbers ("07", "7.0" and "7" are the same) and the operand order of
+    commutative operators, so "3 + 4" and "(4) + 3" share a hash while
+    "3 - 4" and "4 - 3" do not. It is computed bottom-up in postfix order:
+    each node gets a canonical form built from its operator and its
+    children's forms, sorted for commutative operators, and forms longer
+    than CANONICAL_FORM_SIZE are replaced by their digest, so the cost is
+    linear in expression size. The root's form is hashed.
+    
+    Args:
+        infix_expr: String of infix expression
+    
+    Returns:
+        Hex string, stable across processes and runs
+    
+    Raises:
+        InfixSyntaxError: If the expression does not parse (see parse_infix)
+    """
+    return canonical_hash_ast(parse_infix(infix_expr))
+
+def canonical_hash_ast(ast):
+    """
+    Hash an already parsed expression (see canonical_hash).
+    
+    Args:
+        ast: InfixAst from parse_infix
+    
+    Returns:
+        Hex string, equal to canonical_hash of the parsed text
+    """
+    texts = ast.stream.texts()
+    return _canonical_hash_postfix([texts[token] for token in ast.tokens])
+
+def _canonical_hash_postfix(tokens):
+    """Canonical hash of postfix tokens, or None if they are not one expression"""
+    blake2b = hashlib.blake2b
+    forms = []
+    
+    for token in tokens:
+        if token in OPCODES:
+            arity = ARITY[token]
+            if len(forms) < arity:
+                return None
+            if arity == 2:
+                right = forms.pop()
+                left = forms.pop()
+                if right < left and token in COMMUTATIVE:
+                    left, right = right, left
+                form = f'({token} {left} {right})'
+            else:
+                operands = forms[-arity:]
+                del forms[-arity:]
+                if token in COMMUTATIVE:
+                    operands.sort()
+                form = f"({token} {' '.join(operands)})"
+            if len(form) > CANONICAL_FORM_SIZE:
+                form = '#' + blake2b(form.encode(), digest_size=8).hexdigest()
+            forms.append(form)
+        elif token[0].isalpha():
+            forms.append(token)
+        elif token[0] != '0' and token.isascii() and token.isdigit():
+            # Integers without leading zeros are already canonical; parsing
+            # them as Fraction would give the same text much more slowly
+            forms.append(token)
+        else:
+            forms.append(str(Fraction(token)))
+    
+    if len(forms) != 1:
+        return None
+    return blake2b(forms[0].encode(), digest_size=8).hexdigest()
+
+def convert_with_hash(infix_expr):
+    """
+    Convert infix to postfix and compute canonical_hash from the result.
+    
+    The hash is built from the postfix tokens, so no parse tree is needed.
+    Results are cached by token sequence, as in infix_to_postfix.
+    
+    Args:
+        infix_expr: String of infix expression
+    
+    Returns:
+        Tuple (postfix, canonical) where canonical is None if the postfix
+        is not a single expression, e.g. for "a (b + c)", which the
+        shunting-yard conversion accepts but parse_infix rejects
+    
+    Raises:
+        InfixSyntaxError: On an invalid token or unbalanced parentheses
+    """
+    result, key = _cache_get('hashed', infix_expr)
+    if result is None:
+        postfix = _convert(lex_infix(infix_expr))
+        result = (postfix, _canonical_hash_postfix(postfix.split()))
+    if key is not None:
+        _cache_put(key, result, infix_expr)
+    return result
+
+def _common_prefix_length(a, b):
+    """Length of the longest common prefix of two strings, compared in C-sized windows"""
+    low = 0
+    high = min(len(a), len(b))
+    
+    while low < high:
+        middle = (low + high + 1) // 2
+        if b.startswith(a[low:middle], low):
+            low = middle
+        else:
+            high = middle - 1
+    
+    return low
+
+class IncrementalConverter:
+    """
+    Infix to postfix converter that re-converts only what an edit changed.
+    
+    After every token it checkpoints the operator stack and the offsets of
+    unclosed parentheses. Both are persistent linked stacks of (item, rest)
+    tuples, so a checkpoint shares everything below the top with the one
+    before it and costs O(1). An edit at offset k resumes from the last
+    checkpoint whose token ends before k, so an edit near the end of a long
+    expression costs about the size of the edit.
+    
+    Steps are ConversionStep records in the delta format of
+    get_conversion_steps(delta=True), each holding its own emitted tokens.
+    """
+    
+    def __init__(self):
+        self.text = ''
+        self.error = None
+        self._ends = array('l')  # Source end offset of each token
+        self._stacks = []        # (stack, depth, shown depth, open parens) after each token
+        self._steps = []         # Step for each token
+    
+    def update(self, text, position=None):
+        """
+        Convert the new text, reusing the steps before the edit.
+        
+        Args:
+            text: The whole expression after the edit
+            position: Offset of the first changed character, if known;
+                otherwise found by comparing with the previous text
+        
+        Returns:
+            Dictionary with 'start' (index of the first step that changed),
+            'steps' (the steps from start on, including the final '(end)'
+            step) and 'error' ({'message', 'position'} or None)
+        """
+        if position is None:
+            position = _common_prefix_length(self.text, text)
+        
+        # Tokens that end before the edit cannot have changed; one ending
+        # right at it may have been extended (e.g. "12" -> "123")
+        keep = bisect_left(self._ends, position)
+        del self._ends[keep:]
+        del self._stacks[keep:]
+        del self._steps[keep:]
+        
+        self.text = text
+        self.error = None
+        offset = self._ends[-1] if keep else 0
+        
+        tokens = scan_infix(text[offset:], offset)
+        try:
+            for token in tokens:
+                self._feed(*token)
+        except InfixSyntaxError as e:
+            error = e
+            try:
+                # As in a full conversion, an invalid token later in the
+                # text is reported before a mismatched parenthesis
+                for _ in tokens:
+                    pass
+            except InfixSyntaxError as lex_error:
+                error = lex_error
+            self.error = {'message': str(error), 'position': error.position}
+        
+        steps = self._steps[keep:]
+        if self.error is None:
+            final = self._finish()
+            if final is not None:
+                steps.append(final)
+        
+        return {'start': keep, 'steps': steps, 'error': self.error}
+    
+    def steps(self):
+        """Get every step of the current conversion (delta format)"""
+        steps = list(self._steps)
+        if self.error is None:
+            final = self._finish()
+            if final is not None:
+                steps.append(final)
+        return steps
+    
+    def postfix(self):
+        """Get the current postfix expression (empty if there is an error)"""
+        if self.error is not None:
+            return ''
+        return ' '.join([token for step in self.steps() for token in step.emit()])
+    
+    def _state(self):
+        """Stack, depth, shown depth and open parens after the last token"""
+        if self._stacks:
+            return self._stacks[-1]
+        return None, 0, 0, None
+    
+    def _feed(self, kind, token, start, end):
+        """Run one shunting-yard step and checkpoint the state after it"""
+        stack, depth, shown, parens = self._state()
+        low = shown
+        emit = []
+        
+        if kind == 'number' or kind == 'name':
+            emit.append(token)
+        elif kind == 'lparen':
+            stack = (OP_LPAREN, stack)
+            depth += 1
+            parens = (start, parens)
+        elif kind == 'rparen':
+            while stack is not None and stack[0] != OP_LPAREN:
+                emit.append(SYMBOLS[stack[0]])
+                stack = stack[1]
+                depth -= 1
+            if stack is None:
+                raise _mismatched(start)
+            stack = stack[1]  # Remove '('
+            depth -= 1
+            parens = parens[1]
+            low = min(low, depth)
+        else:
+            opcode = OPCODES[token]
+            precedence = PRECEDENCE_BY_CODE[opcode]
+            left = opcode not in RIGHT_ASSOCIATIVE_CODES
+            # A prefix operator comes before its operand, so it pops nothing
+            while stack is not None and stack[0] != OP_LPAREN and opcode not in PREFIX_CODES:
+                top = PRECEDENCE_BY_CODE[stack[0]]
+                if top > precedence or (top == precedence and left):
+                    emit.append(SYMBOLS[stack[0]])
+                    stack = stack[1]
+                    depth -= 1
+                else:
+                    break
+            low = min(low, depth)
+        
+        step = ConversionStep(len(self._steps) + 1, token, kind, emit, 0, len(emit),
+                              stack, depth, shown, low, True)
+        shown = depth
+        
+        # The trace shows an operator on the stack from the next step on
+        if kind == 'operator':
+            stack = (opcode, stack)
+            depth += 1
+        
+        self._ends.append(end)
+        self._stacks.append((stack, depth, shown, parens))
+        self._steps.append(step)
+    
+    def _finish(self):
+        """Build the final step that pops the remaining operators"""
+        stack, depth, shown, parens = self._state()
+        if stack is None:
+            return None
+        
+        emit = []
+        while stack is not None:
+            if stack[0] == OP_LPAREN:
+                self.error = {'message': str(_mismatched(parens[0])), 'position': parens[0]}
+                return None
+            emit.append(SYMBOLS[stack[0]])
+            stack = stack[1]
+        
+        return ConversionStep(len(self._steps) + 1, '(end)', 'end', emit, 0, len(emit), None, 0, shown, 0, True)
@@ -0,0 +1,317 @@
+"""
+Shared lexer producing compact, array-backed token streams
+"""
+
+import re
+from array import array
+
+from utils.operators import OPERATOR_TABLE
+
+# Opcodes stored in TokenStream.opcodes. Operators take the positive codes
+# after OP_NUMBER in registry order; everything else is negative.
+OP_NUMBER = 1
+OP_LPAREN = -1
+OP_RPAREN = -2
+OP_NAME = -3
+OP_INVALID = -4
+
+OPCODES = {entry['symbol']: code for code, entry in enumerate(OPERATOR_TABLE, OP_NUMBER + 1)}
+SYMBOLS = {code: symbol for symbol, code in OPCODES.items()}
+SYMBOLS[OP_LPAREN] = '('
+SYMBOLS[OP_RPAREN] = ')'
+
+# Operator properties indexed by opcode
+PRECEDENCE_BY_CODE = {OPCODES[entry['symbol']]: entry['precedence'] for entry in OPERATOR_TABLE}
+PRECEDENCE_BY_CODE[OP_LPAREN] = 0
+PRECEDENCE_BY_CODE[OP_RPAREN] = 0
+ARITY_BY_CODE = {OPCODES[entry['symbol']]: entry['arity'] for entry in OPERATOR_TABLE}
+RIGHT_ASSOCIATIVE_CODES = frozenset(OPCODES[entry['symbol']] for entry in OPERATOR_TABLE
+                                    if entry['associativity'] == 'right')
+# Operators taking one operand are written before it in infix ("~ 3")
+PREFIX_CODES = frozenset(code for code, arity in ARITY_BY_CODE.items() if arity == 1)
+
+class InfixSyntaxError(ValueError):
+    """Raised when an infix expression cannot be parsed"""
+    
+    def __init__(self, message, position):
+        super().__init__(f"{message} at position {position}")
+        self.position = position
+
+class TokenStream:
+    """
+    Token stream stored in parallel arrays.
+    
+    opcodes holds one signed byte per token, values the numeric value of
+    number tokens (0.0 otherwise) and starts/ends the token's offsets in
+    source, so token text is only materialized when a caller asks for it.
+    
+    A stream built from already split token texts keeps those instead and
+    computes values and offsets the first time they are read, which for
+    postfix and plain infix input is usually only when reporting an error.
+    """
+    __slots__ = ('source', 'opcodes', '_values', '_starts', '_ends', '_texts')
+    
+    def __init__(self, source, opcodes=(), values=(), starts=(), ends=(), texts=None):
+        self.source = source
+        self.opcodes = array('b', opcodes)
+        self._texts = texts
+        if texts is None:
+            self._values = array('d', values)
+            self._starts = array('l', starts)
+            self._ends = array('l', ends)
+        else:
+            self._values = None
+            self._starts = None
+            self._ends = None
+    
+    def __len__(self):
+        return len(self.opcodes)
+    
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = array('d', [float(token) if opcode == OP_NUMBER else 0.0
+                                       for opcode, token in zip(self.opcodes, self._texts)])
+        return self._values
+    
+    @property
+    def starts(self):
+        if self._starts is None:
+            self._locate()
+        return self._starts
+    
+    @property
+    def ends(self):
+        if self._ends is None:
+            self._locate()
+        return self._ends
+    
+    def _locate(self):
+        """Find the offsets of the token texts in source"""
+        find = self.source.find
+        starts = array('l')
+        ends = array('l')
+        position = 0
+        
+        for token in self._texts:
+            position = find(token, position)
+            starts.append(position)
+            position += len(token)
+            ends.append(position)
+        
+        self._starts = starts
+        self._ends = ends
+    
+    def append(self, opcode, value, start, end):
+        """Add one token to the stream"""
+        self.opcodes.append(opcode)
+        self.values.append(value)
+        self.starts.append(start)
+        self.ends.append(end)
+        if self._texts is not None:
+            self._texts.append(self.source[start:end])
+    
+    def text(self, index):
+        """Get the source text of a token"""
+        if self._texts is not None:
+            return self._texts[index]
+        return self.source[self._starts[index]:self._ends[index]]
+    
+    def texts(self):
+        """Get the source text of every token as a list"""
+        if self._texts is not None:
+            return self._texts
+        source = self.source
+        return [source[start:end] for start, end in zip(self._starts, self._ends)]
+
+def _classify_postfix(token):
+    """Get the opcode of a postfix token that is not an operator"""
+    if token.isdigit() or (token[0] == '-' and token[1:].isdigit()):
+        return OP_NUMBER
+    if token.isalnum() and not token[0].isdigit():
+        return OP_NAME
+    return OP_INVALID
+
+def lex_postfix(expression):
+    """
+    Lex a whitespace-separated postfix expression.
+    
+    One split() produces the token texts and one pass maps them to opcodes;
+    values and offsets are only computed if they are read (see TokenStream).
+    
+    Args:
+        expression: String of postfix expression (e.g., "3 4 + 5 *")
+    
+    Returns:
+        TokenStream; integer literals (optionally negative) are OP_NUMBER,
+        identifiers are OP_NAME and anything else unknown is OP_INVALID
+    """
+    texts = expression.split()
+    get_code = OPCODES.get
+    # Operator codes are all positive, so `or` only falls through for operands
+    opcodes = [get_code(token) or _classify_postfix(token) for token in texts]
+    return TokenStream(expression, opcodes, texts=texts)
+
+# Infix scanner: the leading whitespace, then exactly one token. The final
+# alternative catches any other character so it can be reported.
+_INFIX_TOKEN = re.compile(r'(\s*)([\d.]+|[^\W\d_][^\W_]*|\S)')
+
+# Opcodes of the single-character tokens
+_CHAR_OPCODES = dict(OPCODES)
+_CHAR_OPCODES['('] = OP_LPAREN
+_CHAR_OPCODES[')'] = OP_RPAREN
+
+_NUMBER_START = frozenset('0123456789.')
+
+# ASCII characters that can only lex to valid tokens: whitespace, letters,
+# digits, operators and parentheses. A '.' may be part of a malformed
+# number, so input holding one goes through the full scanner.
+_PLAIN_CHARACTERS = bytes(c for c in range(128)
+                          if chr(c).isspace() or chr(c).isalnum() or chr(c) in _CHAR_OPCODES)
+
+# Token texts of plain input, and the opcode of a plain token by its first character
+_PLAIN_TOKEN = re.compile(r'[0-9]+|[A-Za-z][A-Za-z0-9]*|\S')
+_PLAIN_OPCODES = dict(_CHAR_OPCODES)
+_PLAIN_OPCODES.update({c: OP_NUMBER for c in '0123456789'})
+_PLAIN_OPCODES.update({c: OP_NAME for c in 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'})
+
+# Token kind reported by scan_infix for each opcode, and for each first
+# character of a plain token
+KINDS = {code: 'operator' for code in ARITY_BY_CODE}
+KINDS.update({OP_NUMBER: 'number', OP_NAME: 'name', OP_LPAREN: 'lparen', OP_RPAREN: 'rparen'})
+_PLAIN_KINDS = {char: KINDS[code] for char, code in _PLAIN_OPCODES.items()}
+
+def _classify(text, start):
+    """Get the opcode and numeric value of one scanned token"""
+    code = _CHAR_OPCODES.get(text)
+    if code is not None:
+        return code, 0.0
+    
+    first = text[0]
+    if first.isdigit() or first == '.':
+        try:
+            return OP_NUMBER, float(text)
+        except ValueError:
+            raise InfixSyntaxError(f"Invalid number '{text}'", start) from None
+    if first.isalpha():
+        return OP_NAME, 0.0
+    raise InfixSyntaxError(f"Unexpected character '{text}'", start)
+
+def _is_plain(expression):
+    """Whether every character of expression is in _PLAIN_CHARACTERS"""
+    return expression.isascii() and not expression.encode().translate(None, _PLAIN_CHARACTERS)
+
+def _content_end(text):
+    """
+    Length of text without its trailing whitespace.
+    
+    Scanning stops there: a whitespace run with no token after it would
+    otherwise be retried from every position, which is quadratic.
+    """
+    if text and text[-1].isspace():
+        return len(text.rstrip())
+    return len(text)
+
+def scan_infix(expression, offset=0):
+    """
+    Scan an infix expression in a single pass.
+    
+    Args:
+        expression: String of infix expression (e.g., "a + b * c")
+        offset: Added to every reported position, for scanning one piece
+            of a larger source
+    
+    Yields:
+        Tuples (kind, text, start, end) where kind is 'number', 'name',
+        'operator', 'lparen' or 'rparen' and start/end are source offsets
+    
+    Raises:
+        InfixSyntaxError: On a character that cannot start a token, or a
+        malformed number such as "1.2.3"
+    """
+    if _is_plain(expression):
+        # Nothing to validate, so skip the whitespace group and _classify
+        kinds = _PLAIN_KINDS
+        for match in _PLAIN_TOKEN.finditer(expression):
+            text = match[0]
+            yield kinds[text[0]], text, match.start() + offset, match.end() + offset
+        return
+    
+    for match in _INFIX_TOKEN.finditer(expression, 0, _content_end(expression)):
+        start, end = match.span(2)
+        text = match.group(2)
+        code = _classify(text, start + offset)[0]
+        yield KINDS[code], text, start + offset, end + offset
+
+def infix_texts(expression):
+    """
+    Split an infix expression into token texts, as lex_infix(...).texts().
+    
+    Plain input (see _PLAIN_CHARACTERS) is split with one findall and no
+    other work; anything else is lexed in full so errors are reported.
+    
+    Args:
+        expression: String of infix expression
+    
+    Returns:
+        List of token texts
+    
+    Raises:
+        InfixSyntaxError: As lex_infix
+    """
+    if _is_plain(expression):
+        return _PLAIN_TOKEN.findall(expression)
+    return lex_infix(expression).texts()
+
+def lex_infix(expression):
+    """
+    Lex an infix expression into a TokenStream.
+    
+    Numbers are runs of digits with at most one '.', names are alphanumeric
+    runs that start with a letter, and operators and parentheses are single
+    characters. Anything else raises InfixSyntaxError (see scan_infix).
+    
+    Args:
+        expression: String of infix expression (e.g., "a + b * c")
+    
+    Returns:
+        TokenStream
+    """
+    if _is_plain(expression):
+        # Nothing to validate: keep the texts, and let the stream compute
+        # values and offsets if they are read
+        texts = _PLAIN_TOKEN.findall(expression)
+        opcode_of = _PLAIN_OPCODES
+        return TokenStream(expression, [opcode_of[text[0]] for text in texts], texts=texts)
+    
+    opcodes = []
+    values = []
+    starts = []
+    ends = []
+    get_code = _CHAR_OPCODES.get
+    position = 0
+    
+    # findall avoids building a match object per token; offsets are
+    # recovered from the lengths of the whitespace and token groups
+    for space, text in _INFIX_TOKEN.findall(expression, 0, _content_end(expression)):
+        start = position + len(space)
+        position = start + len(text)
+        code = get_code(text)
+        if code is not None:
+            opcodes.append(code)
+            values.append(0.0)
+        elif text[0] in _NUMBER_START:
+            # Numbers are the common case, so skip the _classify call
+            try:
+                values.append(float(text))
+            except ValueError:
+                _classify(text, start)
+            opcodes.append(OP_NUMBER)
+        else:
+            code, value = _classify(text, start)
+            opcodes.append(code)
+            values.append(value)
+        starts.append(start)
+        ends.append(position)
+    
+    return TokenStream(expression, opcodes, values, starts, ends)
@@ -0,0 +1,80 @@
+"""
+Operator registry shared by the postfix evaluator and the infix converter
+"""
+
+import operator
+from fractions import Fraction
+
+def canonical(value):
+    """Collapse whole-number fractions back to int"""
+    if value.__class__ is Fraction and value.denominator == 1:
+        return value.numerator
+    return value
+
+def _exact(op):
+    """Wrap an arithmetic operator so Fraction results stay canonical"""
+    def apply(a, b):
+        return canonical(op(a, b))
+    return apply
+
+def _divide(a, b):
+    """Division that reports division by zero the same way as the evaluator"""
+    if b == 0:
+        raise ValueError("Division by zero")
+    return a / b
+
+def _divide_exact(a, b):
+    """Division that stays in int when it can and promotes to Fraction otherwise"""
+    if b == 0:
+        raise ValueError("Division by zero")
+    if a.__class__ is int and b.__class__ is int:
+        quotient, remainder = divmod(a, b)
+        if remainder == 0:
+            return quotient
+        return Fraction(a, b)
+    if a.__class__ is float or b.__class__ is float:
+        return a / b
+    return canonical(Fraction(a) / b)
+
+def _power_exact(a, b):
+    """Exponentiation that is exact for integer exponents"""
+    if b.__class__ is int:
+        if b >= 0:
+            return canonical(a ** b)
+        if a == 0:
+            raise ValueError("Division by zero")
+        return canonical(Fraction(a) ** b)
+    # Fractional exponents have no exact rational result in general
+    return float(a) ** float(b)
+
+# One entry per operator. 'ufunc' names the NumPy function used by the
+# vectorized evaluators so this module does not need to import NumPy.
+# 'commutative' operators give the same result with their operands swapped.
+# 'arity' is the number of operands popped in postfix; operators with arity
+# 1 are written as prefix operators in infix.
+OPERATOR_TABLE = [
+    {'symbol': '+', 'arity': 2, 'precedence': 1, 'associativity': 'left', 'commutative': True,
+     'apply': operator.add, 'apply_exact': _exact(operator.add), 'ufunc': 'add'},
+    {'symbol': '-', 'arity': 2, 'precedence': 1, 'associativity': 'left', 'commutative': False,
+     'apply': operator.sub, 'apply_exact': _exact(operator.sub), 'ufunc': 'subtract'},
+    {'symbol': '*', 'arity': 2, 'precedence': 2, 'associativity': 'left', 'commutative': True,
+     'apply': operator.mul, 'apply_exact': _exact(operator.mul), 'ufunc': 'multiply'},
+    {'symbol': '/', 'arity': 2, 'precedence': 2, 'associativity': 'left', 'commutative': False,
+     'apply': _divide, 'apply_exact': _divide_exact, 'ufunc': 'divide'},
+    {'symbol': '^', 'arity': 2, 'precedence': 3, 'associativity': 'right', 'commutative': False,
+     'apply': operator.pow, 'apply_exact': _power_exact, 'ufunc': 'power'},
+]
+
+# Lookup tables precomputed from OPERATOR_TABLE
+OPERATORS = {entry['symbol']: entry for entry in OPERATOR_TABLE}
+OPERATOR_SYMBOLS = frozenset(OPERATORS)
+ARITY = {entry['symbol']: entry['arity'] for entry in OPERATOR_TABLE}
+PRECEDENCE = {entry['symbol']: entry['precedence'] for entry in OPERATOR_TABLE}
+PRECEDENCE['('] = 0
+PRECEDENCE[')'] = 0
+RIGHT_ASSOCIATIVE = frozenset(entry['symbol'] for entry in OPERATOR_TABLE
+                              if entry['associativity'] == 'right')
+COMMUTATIVE = frozenset(entry['symbol'] for entry in OPERATOR_TABLE if entry['commutative'])
+IMPLEMENTATIONS = {entry['symbol']: entry['apply'] for entry in OPERATOR_TABLE}
+EXACT_IMPLEMENTATIONS = {entry['symbol']: entry['apply_exact'] for entry in OPERATOR_TABLE}
+UFUNCS = {entry['symbol']: entry['ufunc'] for entry in OPERATOR_TABLE}
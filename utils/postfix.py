@@ -2,12 +2,453 @@
 Postfix (Reverse Polish Notation) evaluation utilities
 """
 
-def evaluate_postfix(expression):
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from itertools import compress, repeat
+
+from utils.operators import (ARITY, IMPLEMENTATIONS, EXACT_IMPLEMENTATIONS,
+                             UFUNCS, canonical)
+from utils.lexer import (lex_postfix, OP_NUMBER, OP_NAME, OPCODES,
+                         SYMBOLS, ARITY_BY_CODE)
+
+# Maximum number of entries kept in the LRU cache of compiled programs; a
+# program is stored under its normalized expression and the spelling it was
+# requested with, if that differs
+PROGRAM_CACHE_SIZE = 512
+
+# Default budgets for evaluating client-supplied expressions
+EVALUATION_LIMITS = {
+    'max_length': 4096,        # characters, checked before tokenizing
+    'max_tokens': 1024,
+    'max_depth': 256,          # operand stack depth
+    'max_magnitude': 10 ** 100,
+    'max_seconds': 0.05        # CPU time of the evaluating thread
+}
+
+# Token count below which evaluate_postfix_parallel stays serial
+PARALLEL_THRESHOLD = 200000
+
+# Longest answer string parse_exact accepts
+MAX_ANSWER_LENGTH = 64
+
+# Answers are an integer, a plain decimal or a fraction; no exponents, so
+# parsing stays linear in the (capped) length
+_ANSWER_PATTERN = re.compile(r'(-?\d+)(?:\.(\d+))?|(-?\d+)/(\d+)')
+
+class LimitExceeded(ValueError):
+    """Raised when an expression exceeds an evaluation budget"""
+    
+    def __init__(self, reason, message):
+        super().__init__(message)
+        self.reason = reason
+
+class PostfixProgram:
+    """
+    A postfix expression compiled into a reusable program.
+    
+    Operands are parsed once and operators are resolved to callables once,
+    so running the program only pushes values and applies functions.
+    The exact variant keeps int operands and exact operators. A program
+    always evaluates to the same value, so run() remembers its results.
+    """
+    __slots__ = ('expression', 'code', 'exact_code', 'max_depth', 'results', 'checked')
+    
+    def __init__(self, expression, code, exact_code, max_depth):
+        self.expression = expression
+        self.code = code
+        self.exact_code = exact_code
+        self.max_depth = max_depth
+        self.results = [None, None]  # float and exact results, once computed
+        self.checked = [None, None]  # smallest max_magnitude each result passed
+    
+    def run(self, exact=False):
+        """
+        Execute the program and return the result.
+        
+        Args:
+            exact: If True, evaluate with int/Fraction arithmetic
+        
+        Returns:
+            float result, or int/Fraction result in exact mode
+        """
+        result = self.results[bool(exact)]
+        if result is not None:
+            return result
+        
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        operand = int if exact else float
+        binary = _BINARY
+        
+        for item in (self.exact_code if exact else self.code):
+            if item.__class__ is operand:
+                push(item)
+            elif item in binary:
+                b = pop()
+                a = pop()
+                push(item(a, b))
+            else:
+                arity = _ARITIES[item]
+                args = stack[-arity:]
+                del stack[-arity:]
+                push(item(*args))
+        
+        result = stack[0]
+        self.results[bool(exact)] = result
+        return result
+    
+    def run_bounded(self, exact, budget):
+        """
+        Execute the program like run(), enforcing a _Budget on every step.
+        
+        A result that stayed within one magnitude limit stays within any
+        larger one, so it is remembered with the smallest limit it passed.
+        """
+        mode = bool(exact)
+        limit = budget.max_magnitude
+        checked = self.checked[mode]
+        if checked is not None and checked <= limit:
+            return self.results[mode]
+        
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        operand = int if exact else float
+        binary = _BINARY
+        code = self.exact_code if exact else self.code
+        # The clock is read every 128 operators, so programs too short to
+        # have that many never read it
+        if len(code) > 256:
+            budget.check_time()
+        countdown = 128
+        
+        for item in code:
+            if item.__class__ is operand:
+                if item > limit or -item > limit:
+                    raise _reject('magnitude', "Value too large")
+                push(item)
+                continue
+            
+            if item in _POWER_IMPLEMENTATIONS:
+                budget.check_power(stack[-2], stack[-1])
+            if item in binary:
+                b = pop()
+                a = pop()
+                result = item(a, b)
+            else:
+                arity = _ARITIES[item]
+                args = stack[-arity:]
+                del stack[-arity:]
+                result = item(*args)
+            
+            if result.__class__ is Fraction:
+                if _magnitude(result) > limit:
+                    raise _reject('magnitude', "Value too large")
+            elif abs(result) > limit:
+                raise _reject('magnitude', "Value too large")
+            push(result)
+            
+            countdown -= 1
+            if not countdown:
+                budget.check_time()
+                countdown = 128
+        
+        result = stack[0]
+        self.results[mode] = result
+        self.checked[mode] = limit
+        return result
+
+# Operator opcode -> (float implementation, exact implementation, arity)
+_OPERATIONS = {code: (IMPLEMENTATIONS[symbol], EXACT_IMPLEMENTATIONS[symbol], ARITY_BY_CODE[code])
+               for symbol, code in OPCODES.items()}
+
+# Compiled operator (float or exact implementation) -> number of operands
+_ARITIES = {apply: arity for apply, _, arity in _OPERATIONS.values()}
+_ARITIES.update({apply_exact: arity for _, apply_exact, arity in _OPERATIONS.values()})
+_BINARY = frozenset(apply for apply, arity in _ARITIES.items() if arity == 2)
+
+_program_cache = OrderedDict()
+_program_cache_lock = threading.Lock()
+_program_cache_stats = {'hits': 0, 'misses': 0}
+
+def normalize_postfix(expression):
+    """Collapse whitespace so equivalent postfix strings share a cache key"""
+    return ' '.join(expression.split())
+
+def _position_error(message, stream, index):
+    """Build a ValueError that points at a token's offset in the source"""
+    return ValueError(f"{message} at position {stream.starts[index]}")
+
+def _compile(expression, key):
+    """Parse a postfix string into a PostfixProgram cached under key"""
+    stream = lex_postfix(expression)
+    
+    if not len(stream):
+        raise ValueError("No valid tokens in expression")
+    
+    code = []
+    exact_code = []
+    add = code.append
+    add_exact = exact_code.append
+    depth = 0
+    max_depth = 0
+    
+    for i, (opcode, token) in enumerate(zip(stream.opcodes, stream.texts())):
+        if opcode == OP_NUMBER:
+            add(float(token))
+            add_exact(int(token))
+            depth += 1
+            if depth > max_depth:
+                max_depth = depth
+        elif opcode > OP_NUMBER:
+            # Operator
+            apply, apply_exact, arity = _OPERATIONS[opcode]
+            if depth < arity:
+                raise _position_error(f"Not enough operands for operator {token}", stream, i)
+            add(apply)
+            add_exact(apply_exact)
+            depth -= arity - 1
+        else:
+            raise _position_error(f"Invalid token: {token}", stream, i)
+    
+    if depth != 1:
+        raise ValueError("Invalid postfix expression")
+    
+    return PostfixProgram(key, code, exact_code, max_depth)
+
+def compile_postfix(expression):
+    """
+    Compile a postfix expression, reusing a cached program when possible.
+    
+    The cache is first checked with the expression exactly as given, so a
+    repeated string costs one lookup. Otherwise it is checked by the
+    normalized expression, and the program is stored under both keys.
+    
+    Args:
+        expression: String of postfix expression (e.g., "3 4 + 5 *")
+    
+    Returns:
+        PostfixProgram ready to run
+    """
+    if not expression:
+        raise ValueError("Empty expression")
+    
+    with _program_cache_lock:
+        program = _program_cache.get(expression)
+        if program is not None:
+            _program_cache.move_to_end(expression)
+            _program_cache_stats['hits'] += 1
+            return program
+    
+    key = normalize_postfix(expression)
+    
+    with _program_cache_lock:
+        program = _program_cache.get(key) if key != expression else None
+        if program is not None:
+            _program_cache_stats['hits'] += 1
+        else:
+            _program_cache_stats['misses'] += 1
+    
+    if program is None:
+        program = _compile(expression, key)
+    
+    with _program_cache_lock:
+        _program_cache[key] = program
+        _program_cache.move_to_end(key)
+        _program_cache[expression] = program
+        while len(_program_cache) > PROGRAM_CACHE_SIZE:
+            _program_cache.popitem(last=False)
+    
+    return program
+
+def get_program_cache_stats():
+    """
+    Get hit/miss counters for the compiled program cache.
+    
+    Returns:
+        Dictionary with 'hits', 'misses', 'size' and 'max_size'
+    """
+    with _program_cache_lock:
+        return {
+            'hits': _program_cache_stats['hits'],
+            'misses': _program_cache_stats['misses'],
+            'size': len(_program_cache),
+            'max_size': PROGRAM_CACHE_SIZE
+        }
+
+def clear_program_cache():
+    """Drop all compiled programs and reset the cache counters"""
+    with _program_cache_lock:
+        _program_cache.clear()
+        _program_cache_stats['hits'] = 0
+        _program_cache_stats['misses'] = 0
+
+_rejection_lock = threading.Lock()
+_rejection_stats = {'rejected': 0, 'by_reason': {}}
+
+def _reject(reason, message):
+    """Count a budget rejection and build the exception for it"""
+    with _rejection_lock:
+        _rejection_stats['rejected'] += 1
+        by_reason = _rejection_stats['by_reason']
+        by_reason[reason] = by_reason.get(reason, 0) + 1
+    return LimitExceeded(reason, message)
+
+def get_rejection_stats():
+    """
+    Get counters for expressions rejected by evaluation budgets.
+    
+    Returns:
+        Dictionary with 'rejected' and a per-reason 'by_reason' breakdown
+    """
+    with _rejection_lock:
+        return {
+            'rejected': _rejection_stats['rejected'],
+            'by_reason': dict(_rejection_stats['by_reason'])
+        }
+
+_POWER_IMPLEMENTATIONS = (IMPLEMENTATIONS['^'], EXACT_IMPLEMENTATIONS['^'])
+
+def _magnitude(value):
+    """Size of a value for budget checks (largest of numerator/denominator)"""
+    if value.__class__ is Fraction:
+        return max(abs(value.numerator), value.denominator)
+    return abs(value)
+
+class _Budget:
+    """
+    Per-evaluation resource budget built from a limits dictionary.
+    
+    Time is this thread's CPU time, so waiting for the GIL or other requests
+    is not charged; the clock starts at the first check_time().
+    """
+    
+    def __init__(self, limits):
+        self.limits = limits
+        self.max_magnitude = limits['max_magnitude']
+        self.deadline = None
+    
+    def check_length(self, expression):
+        if len(expression) > self.limits['max_length']:
+            raise _reject('length', f"Expression longer than {self.limits['max_length']} characters")
+    
+    def check_program(self, program):
+        if len(program.code) > self.limits['max_tokens']:
+            raise _reject('tokens', f"Expression has more than {self.limits['max_tokens']} tokens")
+        if program.max_depth > self.limits['max_depth']:
+            raise _reject('depth', f"Expression needs a stack deeper than {self.limits['max_depth']}")
+    
+    def check_value(self, value):
+        if _magnitude(value) > self.max_magnitude:
+            raise _reject('magnitude', "Value too large")
+    
+    def check_time(self):
+        now = time.thread_time()
+        if self.deadline is None:
+            self.deadline = now + self.limits['max_seconds']
+        elif now > self.deadline:
+            raise _reject('time', "Evaluation took too long")
+    
+    def check_power(self, base, exponent):
+        """Refuse a power whose result would be too large, before computing it"""
+        base = _magnitude(base)
+        if base > 1 and math.log2(base) * abs(float(exponent)) > math.log2(self.max_magnitude):
+            raise _reject('magnitude', "Value too large")
+    
+    def apply(self, item, args):
+        """Apply an operator, refusing powers whose result would be too large"""
+        if item in _POWER_IMPLEMENTATIONS:
+            self.check_power(*args)
+        result = item(*args)
+        self.check_value(result)
+        return result
+
+def evaluate_postfix(expression, exact=False, limits=None, parallel=False):
     """
     Evaluate a postfix expression.
     
     Args:
         expression: String of postfix expression (e.g., "3 4 + 5 *")
+        exact: If True, keep integer work in int and promote to Fraction
+               only when division leaves a remainder
+        limits: Optional budget dictionary (see EVALUATION_LIMITS); use it
+                for client-supplied input. Exceeding it raises LimitExceeded
+        parallel: If True (and no limits are given), evaluate very large
+                  expressions with evaluate_postfix_parallel
+    
+    Returns:
+        Result of the expression evaluation
+    """
+    if limits is None:
+        if parallel:
+            return evaluate_postfix_parallel(expression, exact)
+        return compile_postfix(expression).run(exact)
+    
+    budget = _Budget(limits)
+    budget.check_length(expression or '')
+    program = compile_postfix(expression)
+    budget.check_program(program)
+    return program.run_bounded(exact, budget)
+
+def _evaluate_segment(segment, exact):
+    """Process pool worker: evaluate one independent subtree"""
+    return _compile(segment, segment).run(exact)
+
+def _plan_subtrees(tokens, starts, target, max_items):
+    """
+    Split the expression tree into independent subtrees of at most target tokens.
+    
+    Returns:
+        Postfix plan whose items are (first, last) token ranges to evaluate
+        in a worker or operator symbols to apply in the parent, or None when
+        the tree is too lopsided (e.g. a long chain) to split usefully
+    """
+    plan = []
+    work = [(starts[-1], len(tokens) - 1, False)]
+    
+    while work:
+        first, last, apply_op = work.pop()
+        if apply_op:
+            plan.append(tokens[last])
+        elif last - first < target or tokens[last] not in ARITY:
+            plan.append((first, last))
+        else:
+            # Children of the operator at `last`, right to left: each ends just
+            # before the operator or the child after it
+            work.append((first, last, True))
+            child_last = last - 1
+            for _ in range(ARITY[tokens[last]]):
+                child_first = starts[child_last]
+                work.append((child_first, child_last, False))
+                child_last = child_first - 1
+        
+        if len(plan) > max_items:
+            return None
+    
+    return plan
+
+def evaluate_postfix_parallel(expression, exact=False, workers=None, threshold=PARALLEL_THRESHOLD):
+    """
+    Evaluate a very large postfix expression on several cores.
+    
+    One linear pass records where every subtree starts; the tree is then cut
+    into independent subtrees that are evaluated in a process pool, and the
+    parent combines their results. Expressions under threshold tokens, and
+    trees that cannot be split into balanced pieces, are evaluated serially.
+    
+    Args:
+        expression: String of postfix expression
+        exact: If True, use int/Fraction arithmetic
+        workers: Number of worker processes (defaults to the CPU count)
+        threshold: Minimum token count for parallel evaluation
     
     Returns:
         Result of the expression evaluation
@@ -15,47 +456,617 @@ def evaluate_postfix(expression):
     if not expression:
         raise ValueError("Empty expression")
     
-    # Split by spaces and filter empty strings
-    tokens = [token.strip() for token in expression.split() if token.strip()]
+    tokens = expression.split()
+    workers = workers or os.cpu_count() or 1
     
-    if not tokens:
-        raise ValueError("No valid tokens in expression")
+    if len(tokens) < threshold or workers < 2:
+        return _compile(expression, expression).run(exact)
+    
+    # starts[i] is the index of the first token of the subtree ending at i
+    starts = array('l', bytes(len(tokens) * array('l').itemsize))
+    pending = []
+    for i, token in enumerate(tokens):
+        if token in ARITY:
+            arity = ARITY[token]
+            if len(pending) < arity:
+                raise ValueError(f"Not enough operands for operator {token}")
+            # The subtree starts where its first operand does
+            del pending[len(pending) - arity + 1:]
+            starts[i] = pending[-1]
+        elif token.isdigit() or (token[0] == '-' and token[1:].isdigit()):
+            starts[i] = i
+            pending.append(i)
+        else:
+            raise ValueError(f"Invalid token: {token}")
     
+    if len(pending) != 1:
+        raise ValueError("Invalid postfix expression")
+    
+    pieces = workers * 4
+    plan = _plan_subtrees(tokens, starts, len(tokens) // pieces, pieces * 4)
+    if plan is None:
+        return _compile(expression, expression).run(exact)
+    
+    ranges = [item for item in plan if item.__class__ is tuple]
+    segments = [' '.join(tokens[first:last + 1]) for first, last in ranges]
+    del tokens, starts
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = iter(list(executor.map(_evaluate_segment, segments, [exact] * len(segments))))
+    
+    implementations = EXACT_IMPLEMENTATIONS if exact else IMPLEMENTATIONS
     stack = []
+    for item in plan:
+        if item.__class__ is tuple:
+            stack.append(next(results))
+        else:
+            arity = ARITY[item]
+            args = stack[-arity:]
+            del stack[-arity:]
+            stack.append(implementations[item](*args))
+    
+    return stack[0]
+
+def format_exact(value):
+    """
+    Format an exact result as a canonical answer string.
+    
+    Args:
+        value: int, Fraction or float result
+    
+    Returns:
+        String such as "12", "-7/3" or "2.5"
+    """
+    if value.__class__ is Fraction:
+        return f"{value.numerator}/{value.denominator}"
+    if value.__class__ is float and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def parse_exact(answer):
+    """
+    Parse a user answer ("12", "2.5", "7/3") into an exact value.
+    
+    Args:
+        answer: Answer string or number
+    
+    Returns:
+        int or Fraction
+    
+    Raises:
+        ValueError: If the answer is longer than MAX_ANSWER_LENGTH or is not
+        an integer, a decimal such as "-2.5" or a fraction such as "7/3"
+    """
+    if answer.__class__ is float:
+        return canonical(Fraction(answer))
     
-    for token in tokens:
-        if token.isdigit() or (token[0] == '-' and token[1:].isdigit()):
-            # Number
+    text = str(answer).strip()
+    match = _ANSWER_PATTERN.fullmatch(text) if len(text) <= MAX_ANSWER_LENGTH else None
+    if match is None:
+        raise ValueError("Invalid answer format")
+    
+    whole, decimals, numerator, denominator = match.groups()
+    if numerator is not None:
+        if int(denominator) == 0:
+            raise ValueError("Invalid answer format")
+        return canonical(Fraction(int(numerator), int(denominator)))
+    if decimals is None:
+        return int(whole)
+    
+    # Keep the sign of "-0.5", whose whole part is 0
+    value = Fraction(int(whole.lstrip('-') + decimals), 10 ** len(decimals))
+    return canonical(-value if whole[0] == '-' else value)
+
+def _is_terminating(value):
+    """Check whether a fraction has a finite decimal expansion"""
+    denominator = value.denominator
+    for factor in (2, 5):
+        while denominator % factor == 0:
+            denominator //= factor
+    return denominator == 1
+
+def answers_match(user_answer, correct):
+    """
+    Compare a user answer against an exact result.
+    
+    Answers are compared exactly. For repeating decimals (e.g. 7/3) a decimal
+    answer with at least two places is accepted when it equals the exact
+    value rounded to the same number of places.
+    
+    Args:
+        user_answer: Answer string typed by the user
+        correct: int/Fraction result (float results fall back to a tolerance)
+    
+    Returns:
+        True if the answer is correct
+    """
+    user = parse_exact(user_answer)
+    
+    if correct.__class__ is float:
+        return abs(float(user) - correct) < 0.0001
+    if user == correct:
+        return True
+    
+    if correct.__class__ is Fraction and not _is_terminating(correct):
+        decimals = str(user_answer).strip().partition('.')[2]
+        if len(decimals) >= 2 and decimals.isdigit():
+            return user == round(correct, len(decimals))
+    
+    return False
+
+class IncrementalEvaluator:
+    """
+    Stateful postfix evaluator that accepts one token at a time.
+    
+    Each call to feed() does O(1) work and reports the current stack depth,
+    the value on top of the stack and the first error seen so far, which is
+    what live feedback needs while the user is still typing.
+    """
+    
+    def __init__(self):
+        self.stack = []
+        self.count = 0
+        self.error = None
+        self.error_index = None
+        self._history = []
+    
+    def feed(self, token):
+        """
+        Process the next token.
+        
+        Args:
+            token: A single postfix token (operand or operator)
+        
+        Returns:
+            State dictionary (see state())
+        """
+        token = token.strip()
+        self.count += 1
+        
+        if self.error is not None:
+            # Keep the first error; later tokens are only counted
+            self._history.append(None)
+            return self.state()
+        
+        stack = self.stack
+        if token and (token.isdigit() or (token[0] == '-' and token[1:].isdigit())):
             stack.append(float(token))
-        elif token in ['+', '-', '*', '/', '^']:
-            # Operator
-            if len(stack) < 2:
-                raise ValueError(f"Not enough operands for operator {token}")
+            self._history.append(())
+        elif token in IMPLEMENTATIONS:
+            arity = ARITY[token]
+            if len(stack) < arity:
+                self._fail(f"Not enough operands for operator {token}")
+                return self.state()
+            
+            args = stack[-arity:]
+            del stack[-arity:]
+            try:
+                stack.append(IMPLEMENTATIONS[token](*args))
+            except (ValueError, ArithmeticError) as e:
+                stack.extend(args)
+                self._fail(str(e))
+                return self.state()
+            self._history.append(tuple(args))
+        else:
+            self._fail(f"Invalid token: {token}")
+        
+        return self.state()
+    
+    def undo(self):
+        """
+        Revert the most recently fed token (e.g. after a backspace).
+        
+        Returns:
+            State dictionary (see state())
+        """
+        if not self._history:
+            return self.state()
+        
+        entry = self._history.pop()
+        self.count -= 1
+        
+        if entry is None:
+            # Token fed after (or causing) the first error
+            if self.error_index == self.count:
+                self.error = None
+                self.error_index = None
+        elif entry:
+            self.stack.pop()
+            self.stack.extend(entry)
+        else:
+            self.stack.pop()
+        
+        return self.state()
+    
+    def reset(self):
+        """Clear all state so the evaluator can be reused"""
+        self.__init__()
+    
+    def state(self):
+        """
+        Get the current evaluation state.
+        
+        Returns:
+            Dictionary with 'tokens', 'depth', 'result', 'complete' and 'error'
+        """
+        depth = len(self.stack)
+        return {
+            'tokens': self.count,
+            'depth': depth,
+            'result': self.stack[-1] if depth else None,
+            'complete': depth == 1 and self.error is None,
+            'error': self.error
+        }
+    
+    def _fail(self, message):
+        self.error = message
+        self.error_index = self.count - 1
+        self._history.append(None)
+
+# Per-row error codes reported by evaluate_many
+EVAL_OK = 0
+EVAL_INVALID_TOKEN = 1
+EVAL_NOT_ENOUGH_OPERANDS = 2
+EVAL_DIVISION_BY_ZERO = 3
+EVAL_LEFTOVER_OPERANDS = 4
+EVAL_EMPTY = 5
+
+# Operands evaluate_many accepts
+_INTEGER = re.compile(r'-?\d+')
+
+# Opcodes for evaluate_many; 0 is the padding code, also used for row breaks
+_BATCH_OPCODES = dict(OPCODES)
+_BATCH_OPCODES['\0'] = 0
+
+def _all_integers(texts):
+    """Whether every text is a run of decimal digits with an optional leading '-'"""
+    joined = '\n' + '\n'.join(texts) + '\n'
+    return (joined.count('-') == joined.count('\n-') and '\n-\n' not in joined and
+            joined.replace('\n-', '').replace('\n', '').isdecimal())
+
+def _encode_batch(expressions, np):
+    """Encode postfix strings into padded opcode/operand arrays"""
+    count = len(expressions)
+    errors = np.zeros(count, dtype=np.int8)
+    rows = [expression or '' for expression in expressions]
+    
+    # The whole batch is split at once, with a NUL token between rows. NUL
+    # is not whitespace and not part of any valid token, so a row holding
+    # one is invalid anyway and is blanked so it cannot fake a row break.
+    source = ' \0 '.join(rows)
+    if source.count('\0') != max(count - 1, 0):
+        for r, row in enumerate(rows):
+            if '\0' in row:
+                errors[r] = EVAL_INVALID_TOKEN
+                rows[r] = ''
+        source = ' \0 '.join(rows)
+    
+    texts = source.split()
+    total = len(texts)
+    # Everything that is not an operator or a row break is taken as a number
+    # here and checked below
+    flat_ops = np.fromiter(map(_BATCH_OPCODES.get, texts, repeat(OP_NUMBER)), dtype=np.int8, count=total)
+    
+    breaks = flat_ops == 0
+    row_index = np.cumsum(breaks)
+    col_index = np.arange(total) - np.concatenate(([0], np.flatnonzero(breaks) + 1))[row_index]
+    tokens = ~breaks
+    lengths = np.bincount(row_index[tokens], minlength=count)
+    errors[(lengths == 0) & (errors == EVAL_OK)] = EVAL_EMPTY
+    
+    numbers = flat_ops == OP_NUMBER
+    number_texts = list(compress(texts, numbers.tolist()))
+    if number_texts and not _all_integers(number_texts):
+        # Some operand is not an integer: find the rows it is in
+        valid = np.array([match is not None for match in map(_INTEGER.fullmatch, number_texts)], dtype=bool)
+        errors[row_index[np.flatnonzero(numbers)[~valid]]] = EVAL_INVALID_TOKEN
+        number_texts = [text if ok else '0' for text, ok in zip(number_texts, valid.tolist())]
+    
+    flat_vals = np.zeros(total, dtype=np.float64)
+    flat_vals[numbers] = np.fromiter(map(float, number_texts), dtype=np.float64, count=len(number_texts))
+    
+    # Scatter the tokens into a padded (rows x width) grid
+    width = int(lengths.max()) if count else 0
+    opcodes = np.zeros((count, width), dtype=np.int8)
+    operands = np.zeros((count, width), dtype=np.float64)
+    opcodes[row_index[tokens], col_index[tokens]] = flat_ops[tokens]
+    operands[row_index[tokens], col_index[tokens]] = flat_vals[tokens]
+    
+    return opcodes, operands, errors
+
+def evaluate_many(expressions):
+    """
+    Evaluate many postfix expressions at once with NumPy.
+    
+    The expressions are encoded into padded opcode/operand arrays and the
+    stack machine runs one token column at a time across every row.
+    Rows that fail are reported in the error array instead of raising.
+    
+    Args:
+        expressions: List of postfix expression strings
+    
+    Returns:
+        Tuple (results, errors): float64 array of results (NaN where the row
+        failed) and int8 array of EVAL_* error codes (EVAL_OK on success)
+    """
+    import numpy as np
+    
+    opcodes, operands, errors = _encode_batch(expressions, np)
+    count, width = opcodes.shape
+    
+    stack = np.zeros((count, width + 1), dtype=np.float64)
+    depth = np.zeros(count, dtype=np.int64)
+    
+    with np.errstate(all='ignore'):
+        for c in range(width):
+            column = opcodes[:, c]
+            active = (column != 0) & (errors == EVAL_OK)
+            if not active.any():
+                continue
             
-            b = stack.pop()
-            a = stack.pop()
+            rows = np.flatnonzero(active & (column == OP_NUMBER))
+            if rows.size:
+                stack[rows, depth[rows]] = operands[rows, c]
+                depth[rows] += 1
             
-            if token == '+':
-                result = a + b
-            elif token == '-':
-                result = a - b
-            elif token == '*':
-                result = a * b
-            elif token == '/':
-                if b == 0:
-                    raise ValueError("Division by zero")
-                result = a / b
-            elif token == '^':
-                result = a ** b
+            rows = np.flatnonzero(active & (column > OP_NUMBER))
+            if not rows.size:
+                continue
             
-            stack.append(result)
-        else:
-            raise ValueError(f"Invalid token: {token}")
+            ops = column[rows]
+            for symbol, code in OPCODES.items():
+                selected = rows[ops == code]
+                if not selected.size:
+                    continue
+                
+                arity = ARITY_BY_CODE[code]
+                short = depth[selected] < arity
+                if short.any():
+                    errors[selected[short]] = EVAL_NOT_ENOUGH_OPERANDS
+                    selected = selected[~short]
+                
+                base = depth[selected] - arity
+                args = [stack[selected, base + k] for k in range(arity)]
+                if symbol == '/':
+                    zero = args[-1] == 0
+                    if zero.any():
+                        errors[selected[zero]] = EVAL_DIVISION_BY_ZERO
+                        keep = ~zero
+                        selected, base = selected[keep], base[keep]
+                        args = [arg[keep] for arg in args]
+                
+                stack[selected, base] = getattr(np, UFUNCS[symbol])(*args)
+                depth[selected] = base + 1
+    
+    errors[(errors == EVAL_OK) & (depth != 1)] = EVAL_LEFTOVER_OPERANDS
+    
+    results = stack[:, 0].copy()
+    results[errors != EVAL_OK] = np.nan
+    return results, errors
+
+def postfix_variables(expression):
+    """
+    List the variables used in a postfix expression, in first-use order.
+    
+    Args:
+        expression: String of postfix expression
+    
+    Returns:
+        List of variable names
+    """
+    stream = lex_postfix(expression)
+    names = []
+    for i, opcode in enumerate(stream.opcodes):
+        if opcode == OP_NAME:
+            name = stream.text(i)
+            if name not in names:
+                names.append(name)
+    return names
+
+def evaluate_bindings(expression, variables, table):
+    """
+    Evaluate one postfix expression for many variable bindings at once.
+    
+    The expression is walked once; every stack entry is a whole column of
+    values, so all N rows are computed by the same NumPy operations.
+    
+    Args:
+        expression: String of postfix expression with variables (e.g. "a b c * +")
+        variables: List of variable names, one per column of table
+        table: Array-like of shape (N, len(variables)) with one binding per row
+    
+    Returns:
+        Tuple (results, errors) like evaluate_many: float64 results (NaN where
+        the row failed) and int8 EVAL_* error codes per row
+    """
+    import numpy as np
+    
+    if not expression:
+        raise ValueError("Empty expression")
+    
+    table = np.asarray(table, dtype=np.float64)
+    if table.ndim != 2 or table.shape[1] != len(variables):
+        raise ValueError("Bindings table must have one column per variable")
+    
+    columns = {name: table[:, i] for i, name in enumerate(variables)}
+    count = table.shape[0]
+    errors = np.zeros(count, dtype=np.int8)
+    stack = []
+    
+    stream = lex_postfix(expression)
+    if not len(stream):
+        raise ValueError("No valid tokens in expression")
+    
+    with np.errstate(all='ignore'):
+        for i, opcode in enumerate(stream.opcodes):
+            if opcode == OP_NUMBER:
+                stack.append(np.full(count, stream.values[i]))
+            elif opcode > OP_NUMBER:
+                symbol = SYMBOLS[opcode]
+                arity = ARITY_BY_CODE[opcode]
+                if len(stack) < arity:
+                    raise _position_error(f"Not enough operands for operator {symbol}", stream, i)
+                args = stack[-arity:]
+                del stack[-arity:]
+                if symbol == '/':
+                    zero = args[-1] == 0
+                    errors[zero & (errors == EVAL_OK)] = EVAL_DIVISION_BY_ZERO
+                stack.append(getattr(np, UFUNCS[symbol])(*args))
+            elif opcode == OP_NAME:
+                name = stream.text(i)
+                if name not in columns:
+                    raise _position_error(f"No binding for variable {name}", stream, i)
+                stack.append(columns[name])
+            else:
+                raise _position_error(f"Invalid token: {stream.text(i)}", stream, i)
     
     if len(stack) != 1:
         raise ValueError("Invalid postfix expression")
     
-    return stack[0]
+    results = np.array(stack[0], dtype=np.float64)
+    results[errors != EVAL_OK] = np.nan
+    return results, errors
+
+def equivalent_by_sampling(first, second, samples=64, seed=None):
+    """
+    Check whether two postfix expressions agree on random variable bindings.
+    
+    Used to auto-check variable answers: both expressions are evaluated over
+    the same random table and compared row by row.
+    
+    Args:
+        first: String of postfix expression
+        second: String of postfix expression
+        samples: Number of random bindings to try
+        seed: Optional seed for reproducible sampling
+    
+    Returns:
+        True if every sampled row gives the same result (or fails the same way)
+    """
+    import numpy as np
+    
+    variables = postfix_variables(first)
+    for name in postfix_variables(second):
+        if name not in variables:
+            variables.append(name)
+    
+    rng = np.random.default_rng(seed)
+    table = rng.integers(1, 10, size=(samples, len(variables))).astype(np.float64)
+    
+    first_results, first_errors = evaluate_bindings(first, variables, table)
+    second_results, second_errors = evaluate_bindings(second, variables, table)
+    
+    if not np.array_equal(first_errors, second_errors):
+        return False
+    
+    ok = first_errors == EVAL_OK
+    return bool(np.allclose(first_results[ok], second_results[ok], rtol=1e-9, equal_nan=True))
+
+def get_evaluation_steps(expression, limits=None):
+    """
+    Get step-by-step evaluation of a postfix expression.
+    
+    Each step records only what changed on the stack: how many values were
+    popped and the value pushed. The client rebuilds every stack state by
+    replaying the steps, so the trace stays linear in expression length.
+    
+    Args:
+        expression: String of postfix expression
+        limits: Optional budget dictionary (see EVALUATION_LIMITS)
+    
+    Returns:
+        List of step dictionaries with 'step', 'token', 'pop', 'push', 'action'
+    """
+    budget = _Budget(limits) if limits is not None else None
+    if budget is not None:
+        budget.check_length(expression or '')
+    
+    program = compile_postfix(expression)
+    if budget is not None:
+        budget.check_program(program)
+    # The program's expression is the normalized source, one token per item
+    tokens = program.expression.split()
+    steps = []
+    stack = []
+    
+    for i, (token, item) in enumerate(zip(tokens, program.exact_code)):
+        if budget is not None:
+            budget.check_time()
+        
+        if item.__class__ is int:
+            if budget is not None:
+                budget.check_value(item)
+            stack.append(item)
+            steps.append({
+                'step': i + 1,
+                'token': token,
+                'pop': 0,
+                'push': format_exact(item),
+                'action': f'Push {token} to stack'
+            })
+        else:
+            arity = ARITY[token]
+            args = stack[-arity:]
+            del stack[-arity:]
+            result = budget.apply(item, args) if budget is not None else item(*args)
+            stack.append(result)
+            operands = [format_exact(arg) for arg in args]
+            value = format_exact(result)
+            if arity == 2:
+                left, right = operands
+                action = f'Pop {right} and {left}, compute {left} {token} {right} = {value}, push result'
+            else:
+                popped = ', '.join(reversed(operands))
+                action = f"Pop {popped}, compute {token}({', '.join(operands)}) = {value}, push result"
+            steps.append({
+                'step': i + 1,
+                'token': token,
+                'pop': arity,
+                'push': value,
+                'action': action
+            })
+    
+    return steps
+
+def validate_postfix_structure(expression):
+    """
+    Check that a postfix expression is well-formed without evaluating it.
+    
+    Only token classes and stack depth are tracked, so no arithmetic is done
+    and long '^' chains cannot overflow.
+    
+    Args:
+        expression: String of postfix expression
+    
+    Returns:
+        Tuple (error_kind, offset): (None, None) when well-formed, otherwise
+        one of 'empty', 'invalid_token', 'not_enough_operands' or
+        'leftover_operands' and the character offset of the offending token
+        (the end of the input for 'empty' and 'leftover_operands')
+    """
+    if not expression:
+        return 'empty', 0
+    
+    stream = lex_postfix(expression)
+    depth = 0
+    
+    for i, opcode in enumerate(stream.opcodes):
+        if opcode == OP_NUMBER:
+            depth += 1
+        elif opcode > OP_NUMBER:
+            arity = ARITY_BY_CODE[opcode]
+            if depth < arity:
+                return 'not_enough_operands', stream.starts[i]
+            depth -= arity - 1
+        else:
+            return 'invalid_token', stream.starts[i]
+    
+    if not len(stream):
+        return 'empty', len(expression)
+    if depth != 1:
+        return 'leftover_operands', len(expression)
+    
+    return None, None
 
 def is_valid_postfix(expression):
     """
@@ -85,4 +1096,3 @@ def format_postfix(expression):
     """
     tokens = [token.strip() for token in expression.split() if token.strip()]
     return ' '.join(tokens)
-
@@ -0,0 +1,146 @@
+"""
+Constant-memory streaming evaluation of postfix expressions
+
+Reads postfix input from a file or stdin in fixed-size chunks, one
+expression per line, and keeps only the operand stack in memory, so peak
+memory depends on stack depth rather than input size.
+
+Usage:
+    python -m utils.postfix_stream expressions.txt
+    generate_expressions | python -m utils.postfix_stream -
+"""
+
+import argparse
+import sys
+
+from utils.operators import IMPLEMENTATIONS, EXACT_IMPLEMENTATIONS, ARITY
+from utils.postfix import format_exact
+
+# Bytes read per chunk
+CHUNK_SIZE = 1 << 16
+
+# Marker yielded by iter_stream_tokens at the end of each line
+END_OF_LINE = None
+
+def iter_stream_tokens(source, chunk_size=CHUNK_SIZE):
+    """
+    Lazily split a file into postfix tokens, one chunk at a time.
+    
+    A token cut in half by a chunk boundary is carried over to the next
+    chunk, so only one chunk plus one partial token is held at a time.
+    
+    Args:
+        source: File object opened in text or binary mode
+        chunk_size: Number of bytes/characters to read at a time
+    
+    Yields:
+        Token strings, and END_OF_LINE after every line and at end of input
+    """
+    pending = ''
+    
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode('ascii', errors='replace')
+        
+        text = pending + chunk if pending else chunk
+        lines = text.split('\n')
+        
+        for line in lines[:-1]:
+            yield from line.split()
+            yield END_OF_LINE
+        
+        # The last piece may end in the middle of a token
+        tail = lines[-1]
+        tokens = tail.split()
+        if tokens and not tail[-1].isspace():
+            pending = tokens.pop()
+        else:
+            pending = ''
+        yield from tokens
+    
+    if pending:
+        yield pending
+    yield END_OF_LINE
+
+def evaluate_stream(source, chunk_size=CHUNK_SIZE, exact=False):
+    """
+    Evaluate one postfix expression per line of a file.
+    
+    Args:
+        source: File object opened in text or binary mode
+        chunk_size: Number of bytes/characters to read at a time
+        exact: If True, use int/Fraction arithmetic (see evaluate_postfix)
+    
+    Yields:
+        Tuple (line_number, result, error) for every non-blank line; result
+        is None when the line failed and error is None when it succeeded
+    """
+    implementations = EXACT_IMPLEMENTATIONS if exact else IMPLEMENTATIONS
+    operand = int if exact else float
+    
+    line_number = 1
+    stack = []
+    error = None
+    seen = False
+    
+    for token in iter_stream_tokens(source, chunk_size):
+        if token is END_OF_LINE:
+            if seen:
+                if error is None and len(stack) != 1:
+                    error = "Invalid postfix expression"
+                yield line_number, (stack[0] if error is None else None), error
+            line_number += 1
+            stack = []
+            error = None
+            seen = False
+            continue
+        
+        seen = True
+        if error is not None:
+            # Skip the rest of a line that already failed
+            continue
+        
+        if token.isdigit() or (token[0] == '-' and token[1:].isdigit()):
+            stack.append(operand(token))
+        elif token in implementations:
+            arity = ARITY[token]
+            if len(stack) < arity:
+                error = f"Not enough operands for operator {token}"
+                continue
+            args = stack[-arity:]
+            del stack[-arity:]
+            try:
+                stack.append(implementations[token](*args))
+            except (ValueError, ArithmeticError) as e:
+                error = str(e)
+        else:
+            error = f"Invalid token: {token}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate postfix expressions, one per line')
+    parser.add_argument('path', help="Input file, or '-' for stdin")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Bytes read per chunk')
+    parser.add_argument('--exact', action='store_true', help='Use exact int/Fraction arithmetic')
+    args = parser.parse_args(argv)
+    
+    failed = False
+    source = sys.stdin.buffer if args.path == '-' else open(args.path, 'rb')
+    
+    try:
+        for line_number, result, error in evaluate_stream(source, args.chunk_size, args.exact):
+            if error is None:
+                print(format_exact(result))
+            else:
+                failed = True
+                print(f"line {line_number}: error: {error}")
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+    
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
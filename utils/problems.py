@@ -10,6 +10,12 @@ class ProblemType(Enum):
     CONVERT = "convert"
     BOTH = "both"
 
+# Attempts at finding a problem that is not equivalent to a recent one
+REPEAT_ATTEMPTS = 10
+
+# Canonical hashes of recently served problems kept per session
+RECENT_PROBLEM_LIMIT = 20
+
 def generate_simple_infix(use_variables=False):
     """Generate a simple infix expression (easy difficulty)"""
     operators = ['+', '-', '*']
@@ -102,7 +108,7 @@ def generate_hard_infix(use_variables=False):
     expr = ' '.join(expr_parts)
     return expr
 
-def generate_problem(difficulty='easy', problem_type='both', use_variables=False):
+def generate_problem(difficulty='easy', problem_type='both', use_variables=False, avoid=()):
     """
     Generate a random problem for practice mode.
     
@@ -110,12 +116,25 @@ def generate_problem(difficulty='easy', problem_type='both', use_variables=False
         difficulty: 'easy', 'medium', or 'hard'
         problem_type: 'evaluate', 'convert', or 'both'
         use_variables: If True, use letters (a, b, c, ...) instead of numbers
+        avoid: Canonical hashes of recently served problems; a problem
+            equivalent to one of them (e.g. "4 + 3" after "3 + 4") is
+            regenerated, up to REPEAT_ATTEMPTS times
     
     Returns:
-        Dictionary with problem data
+        Dictionary with problem data; 'canonical' is the problem's canonical
+        hash (see canonical_hash), or None if its expression does not parse
     """
-    from utils.infix_to_postfix import infix_to_postfix
-    from utils.postfix import evaluate_postfix
+    for _ in range(REPEAT_ATTEMPTS):
+        problem = _generate_problem(difficulty, problem_type, use_variables)
+        if problem['canonical'] is None or problem['canonical'] not in avoid:
+            break
+    
+    return problem
+
+def _generate_problem(difficulty, problem_type, use_variables):
+    """Generate one problem, without repeat avoidance"""
+    from utils.infix_to_postfix import parse_infix, canonical_hash_ast, convert_with_hash
+    from utils.postfix import format_exact
     
     # Determine actual problem type
     if problem_type == 'both':
@@ -136,10 +155,10 @@ def generate_problem(difficulty='easy', problem_type='both', use_variables=False
         infix_expr = generate_hard_infix(use_variables)
     
     if actual_type == 'evaluate':
-        # Convert to postfix and evaluate (must use numbers)
-        postfix_expr = infix_to_postfix(infix_expr.replace(' ', ''))
+        # Parse once; the postfix form and the answer both come from the AST
         try:
-            result = evaluate_postfix(postfix_expr)
+            ast = parse_infix(infix_expr)
+            result = ast.evaluate(exact=True)
         except:
             # If evaluation fails, generate a simpler one with numbers
             if difficulty == 'easy':
@@ -148,25 +167,28 @@ def generate_problem(difficulty='easy', problem_type='both', use_variables=False
                 infix_expr = generate_medium_infix(False)
             else:
                 infix_expr = generate_hard_infix(False)
-            postfix_expr = infix_to_postfix(infix_expr.replace(' ', ''))
-            result = evaluate_postfix(postfix_expr)
+            ast = parse_infix(infix_expr)
+            result = ast.evaluate(exact=True)
+        postfix_expr = ast.postfix()
         
         return {
             'type': 'evaluate',
             'question': f'Evaluate the following postfix expression:',
             'expression': postfix_expr,
-            'correct_answer': result,
-            'hint': 'Remember: process left to right, push operands, pop two when you see an operator'
+            'correct_answer': format_exact(result),
+            'hint': 'Remember: process left to right, push operands, pop two when you see an operator',
+            'canonical': canonical_hash_ast(ast)
         }
     
     else:  # convert
-        postfix_expr = infix_to_postfix(infix_expr.replace(' ', ''))
+        postfix_expr, canonical = convert_with_hash(infix_expr)
         
         return {
             'type': 'convert',
             'question': f'Convert the following infix expression to postfix:',
             'expression': infix_expr,
             'correct_answer': postfix_expr,
-            'hint': 'Use the stack algorithm: operands go to output, operators go to stack based on precedence'
+            'hint': 'Use the stack algorithm: operands go to output, operators go to stack based on precedence',
+            'canonical': canonical
         }
 